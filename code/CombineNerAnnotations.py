@@ -6,60 +6,201 @@ files = [
 
 
 
+import argparse
+import hashlib
 import json
-from collections import defaultdict, Counter
+import math
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from agreement import AgreementCollector, summary, write_report
+from annotation_sources import is_file_source, iter_source, parse_sources
+from instrumentation import add_profile_arguments, count, finish_profile, stage, start_profile, timed
+from span_reconcile import Vote, reconcile_spans
 
-def load_annotations(filepath):
-    with open(filepath, "r", encoding="utf-8") as f:
-        return [json.loads(line) for line in f if line.strip()]
 
 def annotation_key(span):
     return (span["start"], span["end"], span["label"])
 
-def merge_annotations(files, output_path):
-    datasets = [load_annotations(f) for f in files]
-
-    # Create dict: text -> doc
-    maps = [{doc["text"]: doc for doc in dataset} for dataset in datasets]
-
-    # Find common texts in all three
-    common_texts = set.intersection(*(set(m.keys()) for m in maps))
-
-    merged = []
-    for text in common_texts:
-        docs = [m[text] for m in maps]
-        merged_spans = defaultdict(int)
-
-        for doc in docs:
-            for span in doc.get("spans", []):
-                merged_spans[annotation_key(span)] += 1
-
-        final_spans = [
-            {
-                "start": k[0],
-                "end": k[1],
-                "label": k[2],
-                "text": text[k[0]:k[1]]
-            }
-            for k, count in merged_spans.items() if count >= 2
-        ]
-
-        merged_doc = docs[0].copy()
-        merged_doc["spans"] = final_spans
-        merged.append(merged_doc)
-
-        
 
+def input_key(eg: Dict[str, Any]):
+    """Key an example by its input hash, or by a digest of its text for old exports."""
+    input_hash = eg.get("_input_hash")
+    if input_hash is not None:
+        return input_hash
+    return hashlib.sha1(eg["text"].encode("utf-8")).hexdigest()
+
+
+def connect_if_needed(sources: List[str]):
+    """Connect to the Prodigy database only if a source is a dataset name."""
+    if all(is_file_source(source) for source in sources):
+        return None
+    from prodigy.components.db import connect
+    return connect()
+
+
+def iter_annotator(db, source: str) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+    """Yield (key, example) for one annotator, keeping their first answer per input."""
+    seen = set()
+    for eg in timed("read", iter_source(db, source)):
+        key = input_key(eg)
+        if key in seen:
+            continue
+        seen.add(key)
+        yield key, eg
+
+
+def collect_votes(db, sources: List[str],
+                  agreement: Optional[AgreementCollector] = None) -> Dict[Any, Tuple[int, List[Vote]]]:
+    """First pass: collect the annotators and span votes of every input.
+
+    Only the span keys are kept per input, never the text, so memory grows
+    with the number of annotated spans and not with the size of the corpus.
+    If given, ``agreement`` records every annotator's spans and choice in
+    the same pass.
+
+    Returns:
+        dict: Input key -> (number of annotators who saw it,
+        (start, end, label, annotator) of every span).
+    """
+    votes: Dict[Any, Tuple[int, List[Vote]]] = {}
+    for annotator, source in enumerate(sources):
+        for key, eg in iter_annotator(db, source):
+            with stage("collect"):
+                if agreement is not None:
+                    agreement.add(annotator, key, eg)
+                seen, spans = votes.get(key, (0, []))
+                spans.extend(annotation_key(span) + (annotator,) for span in eg.get("spans", []))
+                votes[key] = (seen + 1, spans)
+            count("examples")
+            count("spans", len(eg.get("spans", [])))
+    return votes
+
+
+def required_votes(quorum: float, seen: int) -> int:
+    """Votes a span needs: a fixed count, or a fraction (below 1) of the annotators who saw the item."""
+    if quorum < 1:
+        return max(1, math.ceil(quorum * seen))
+    return int(quorum)
+
+
+def exact_spans(spans: List[Vote], required: int) -> List[Tuple[int, int, str]]:
+    """Return the (start, end, label) keys that at least ``required`` annotators marked."""
+    counts = Counter(span[:3] for span in set(spans))
+    return sorted(key for key, count in counts.items() if count >= required)
+
+
+def final_spans(text: str, spans: List[Vote], required: int,
+                min_overlap: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Return the merged spans, in text order.
+
+    Without ``min_overlap`` only exact (start, end, label) matches count;
+    with it, overlapping spans are reconciled by span_reconcile.
+    """
+    if min_overlap is None:
+        keys = exact_spans(spans, required)
+    else:
+        keys = reconcile_spans(spans, required, min_overlap)
+    return [
+        {
+            "start": start,
+            "end": end,
+            "label": label,
+            "text": text[start:end]
+        }
+        for start, end, label in keys
+    ]
+
+
+def iter_merged(db, sources: List[str], votes: Dict[Any, Tuple[int, List[Vote]]],
+                quorum: float, min_annotators: int,
+                min_overlap: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """Second pass: yield one merged example per input, as soon as its first copy is read.
+
+    Inputs seen by fewer than ``min_annotators`` annotators are left out.
+    """
+    for source in sources:
+        for key, eg in iter_annotator(db, source):
+            if key not in votes:
+                continue  # already written
+            seen, spans = votes.pop(key)
+            if seen < min_annotators:
+                continue
+            with stage("merging"):
+                merged_doc = eg.copy()
+                merged_doc["spans"] = final_spans(eg["text"], spans, required_votes(quorum, seen), min_overlap)
+            count("merged_spans", len(merged_doc["spans"]))
+            yield merged_doc
+
+
+def merge_annotations(sources: Iterable[str], output_path, quorum: float = 2,
+                      min_annotators: int = 2, db=None, report_path=None,
+                      min_overlap: Optional[float] = None) -> int:
+    """Merge the span annotations of any number of annotators into one JSONL file.
+
+    Args:
+        sources: Exported JSON(L) files or Prodigy dataset names, one per annotator.
+        output_path: Where to write the merged examples.
+        quorum (float): Votes a span needs to be kept; a value below 1 is a
+            fraction of the annotators who saw the item.
+        min_annotators (int): Leave out items fewer annotators have seen.
+        db: Prodigy database for dataset sources, connected if not given.
+        report_path: If set, write an inter-annotator agreement report there.
+        min_overlap (float): If set, group spans that overlap by at least
+            this fraction of the shorter one and reconcile their boundaries,
+            instead of only counting exact matches.
+
+    Returns:
+        int: The number of merged examples written.
+    """
+    sources = list(sources)
+    if db is None:
+        db = connect_if_needed(sources)
+
+    agreement = AgreementCollector(sources) if report_path else None
+    votes = collect_votes(db, sources, agreement)
+    print(f"Collected votes for {len(votes)} inputs from {len(sources)} annotators")
+
+    if agreement is not None:
+        with stage("agreement"):
+            report = agreement.report()
+        write_report(report, report_path)
+        print("\n".join(summary(report)))
+        print(f"Agreement report written to {report_path}")
+
+    written = 0
     with open(output_path, "w", encoding="utf-8") as f:
-        for doc in merged:
-            f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+        for doc in iter_merged(db, sources, votes, quorum, min_annotators, min_overlap):
+            with stage("write"):
+                f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+            written += 1
+    count("merged", written)
+
+    print(f"Merged {written} documents written to {output_path}")
+    return written
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Merge NER annotations of several annotators by majority vote.")
+    parser.add_argument("--sources", default=",".join(files),
+                        help="Comma-separated JSONL exports, corpus stores or Prodigy datasets, one per annotator")
+    parser.add_argument("--output", default="merged_output.jsonl", help="Merged JSONL file to write")
+    parser.add_argument("--quorum", type=float, default=2,
+                        help="Votes a span needs; a value below 1 is a fraction of the annotators who saw the item")
+    parser.add_argument("--min-annotators", type=int, default=2,
+                        help="Leave out items seen by fewer annotators")
+    parser.add_argument("--min-overlap", type=float,
+                        help="Reconcile overlapping spans that share at least this fraction of the shorter one, "
+                             "e.g. 0.5, instead of only counting exact matches")
+    parser.add_argument("--report", help="Also write an inter-annotator agreement report (JSON) to this path")
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
 
-    print(f"Merged {len(merged)} documents written to {output_path}")
 
 # Example usage
 if __name__ == "__main__":
-
-    output = "merged_output.jsonl"
-    merge_annotations(files, output)
-
-
+    args = parse_args()
+    start_profile(args.profile, args.profile_stage)
+    merge_annotations(parse_sources(args.sources), args.output, args.quorum, args.min_annotators,
+                      report_path=args.report, min_overlap=args.min_overlap)
+    finish_profile(args.profile, {"script": "CombineNerAnnotations"})
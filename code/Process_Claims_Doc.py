@@ -1,70 +1,55 @@
-import spacy
+import time
+_import_started = time.perf_counter()
+
 import re
+import argparse
 from spacy.tokenizer import Tokenizer
 
 import json
-from typing import List, Set, Optional
-from word2number import w2n
-from typing import Set, Any, Dict, List, Optional
+from collections import deque
 from process_claims import get_target_entities
+from numeric_values import convert_phrase
+from json_stream import iter_json_records, write_jsonl
+from entity_cache import EntityCache, ShardEntityCache, cache_window, merge_caches, run_cached
+from spacy_models import get_model, cold_start_report
+from text_chunks import split_into_chunks
+from sharding import (
+    iter_shard_input, remove_shards, run_sharded, shard_cache_path, shard_cache_paths, write_shard_output,
+)
+from instrumentation import add_profile_arguments, count, finish_profile, progress, stage, start_profile, timed
+
+# Entity-only mode (--entity-only): load the pipeline without the components
+# that do not produce doc.ents, and tag long documents in chunks of at most
+# CHUNK_CHARS. Off by default, so entities at chunk edges match a full run
+ENTITY_ONLY = False
+CHUNK_CHARS = 10_000
+
+MODEL_NAME = 'en_core_web_sm'
+
+# Batching settings for process_data_batched
+BATCH_SIZE = 64
+N_PROCESS = 1
 
-# Load the pre-trained spaCy model
-nlp = spacy.load('en_core_web_sm')
+# Default input and output locations, relative to this directory
+INPUT_PATH = '../../../data/binary_data/filtered_quantemp_claims_10p.json'
+OUTPUT_PATH = '../../../data/Processed/tagged/spaCy_Results.json'
+
+# The pre-trained spaCy model, loaded once on first use
+def get_nlp():
+    return get_model(MODEL_NAME, entity_only=ENTITY_ONLY)
+
+# Chunking can change entities at chunk edges, so it is part of the cache key
+def cache_namespace():
+    return f"doc_entities_chunks{CHUNK_CHARS}" if ENTITY_ONLY else "doc_entities"
 
 def load_json(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)  # regular dict
 
 
-def convert_phrase(phrase: str) -> Optional[str]:
-    """Convert a phrase of words to a formatted number with commas."""
-    try:
-        words = phrase.lower().split()
-        result, has_dollar = handle_currency_and_multiplier(words)
-
-        if result:
-            return result
-
-        # Regular conversion for other cases
-        num = w2n.word_to_num(phrase)
-        formatted = "{:,}".format(num)
-        return f"${formatted}" if has_dollar else formatted
-    except ValueError:
-        return None
-
-def handle_currency_and_multiplier(words: List[str]) -> tuple:
-    """Process currency symbols and multipliers in number words."""
-    has_dollar = False
-    if words[0].startswith("$"):
-        words[0] = words[0][1:]
-        has_dollar = True
-
-    if len(words) == 2 and words[1] in get_multipliers():
-        try:
-            base_num = float(words[0].replace(",", ""))
-        except ValueError:
-            try:
-                base_num = w2n.word_to_num(words[0])
-            except ValueError:
-                return None, has_dollar
-
-        final_num = base_num * get_multipliers()[words[1]]
-        formatted = "{:,.0f}".format(final_num)
-        return f"${formatted}" if has_dollar else formatted, has_dollar
-
-    return None, False
-
-def get_multipliers() -> Dict[str, int]:
-    """Return a dictionary of multiplier words and their values."""
-    return {
-        "thousand": 1000,
-        "million": 1000000,
-        "billion": 1000000000,
-        "trillion": 1000000000000,
-    }
-
 # Tokenize and label text using spaCy
 def tokenize_and_label(text):
+    nlp = get_nlp()
     nlp.tokenizer = custom_tokenizer(nlp)
     doc = nlp(text)
     tokens = [token.text for token in doc]
@@ -75,8 +60,25 @@ def custom_tokenizer(nlp):
     return Tokenizer(nlp.vocab, infix_finditer=infix_re.finditer)
 
 # Extract entities from text using spaCy
-def extract_entities(text):
-    doc = nlp(text)
+def extract_entities(text, cache=None):
+    if cache is not None:
+        cached = cache.get(text)
+        if cached is not None:
+            return cached
+    entities = next(_run_ner([text], n_process=1))
+    if cache is not None:
+        cache.put(text, entities)
+    return entities
+
+# Extract entities from an already processed spaCy doc. offset is where the
+# doc starts in the original text when it is a chunk of a longer document.
+def entities_from_doc(doc, offset=0):
+    with stage("entities"):
+        entities = _entities_from_doc(doc, offset)
+    count("entities", len(entities))
+    return entities
+
+def _entities_from_doc(doc, offset):
     entities = []
 
     for ent in doc.ents:
@@ -91,51 +93,245 @@ def extract_entities(text):
             entity_entry = {
                 "text": formatted_value if formatted_value else ent.text,
                 "label": ent.label_,
-                "start": start_token.idx,
-                "end": end_token.idx + len(end_token)
+                "start": start_token.idx + offset,
+                "end": end_token.idx + len(end_token) + offset
             }
             entities.append(entity_entry)
     
     return entities
+
+# Builds the output record of one entry
+def build_record(entry, claim_entities, doc_entities):
+    url = entry.get("url", "")
+    return {
+        url: {
+        "label": entry.get("label", ""),
+        "claim": entry.get("claim", ""),
+        "claim_entities": claim_entities,
+        "doc": entry.get("doc", ""),
+        "doc_entities": doc_entities
+        }
+    }
+
 # takes data and adds it to a list in correct format
-def process_data(json_data):
-    output = []    
-    counter = 0
+def process_data(json_data, cache=None):
+    output = []
     for entry in json_data:
-        counter += 1
+        claim_entities = extract_entities(entry.get("claim", ""), cache)
+        doc_entities = extract_entities(entry.get("doc", ""), cache)
 
-        url = entry.get("url", "")
-    
-        claim = entry.get("claim", "")
-        claim_entities = extract_entities(claim)
-        
-        doc = entry.get("doc", "")
-        doc_entities = extract_entities(doc)
-        
-        label = entry.get("label", "")
-
-        output.append({
-            url: {
-            "label": label,
-            "claim": claim,
-            "claim_entities": claim_entities,
-            "doc": doc,
-            "doc_entities": doc_entities
-            }
-        })
-        print(counter)
-        
+        output.append(build_record(entry, claim_entities, doc_entities))
+        progress("entries")
+
+    if cache is not None:
+        print(cache.report())
     return output
 
-# Loads the data
-with open('../../../data/binary_data/filtered_quantemp_claims_10p.json', 'r') as file:
-    data = json.load(file)
+# Yields claim and doc of every entry, remembering the entry for reassembly
+def _iter_texts(json_data, pending):
+    for entry in json_data:
+        pending.append(entry)
+        yield entry.get("claim", "")
+        yield entry.get("doc", "")
+
+# Yields the chunks of every text, remembering each text's chunk offsets
+def _iter_chunks(texts, pending):
+    for text in texts:
+        chunks = split_into_chunks(text, CHUNK_CHARS)
+        pending.append([offset for offset, _ in chunks])
+        count("chunks", len(chunks))
+        for _, chunk in chunks:
+            yield chunk
+
+# Runs NER over chunks in batches and yields one entity list per text
+def pipe_chunked(texts, batch_size=BATCH_SIZE, n_process=N_PROCESS):
+    """Yield the entities of every text, with offsets into the full text.
+
+    Every text becomes at least one chunk, so the docs coming back from
+    nlp.pipe can be regrouped per text using the recorded chunk offsets.
+    """
+    pending = deque()
+    docs = get_nlp().pipe(_iter_chunks(texts, pending), batch_size=batch_size, n_process=n_process)
+    docs = timed("ner", docs)
+    for first_doc in docs:
+        offsets = pending.popleft()
+        entities = entities_from_doc(first_doc, offsets[0])
+        for offset in offsets[1:]:
+            entities.extend(entities_from_doc(next(docs), offset))
+        yield entities
+
+# Yields one entity list per text, using chunking in entity-only mode
+def _run_ner(texts, batch_size=BATCH_SIZE, n_process=N_PROCESS):
+    if ENTITY_ONLY:
+        return pipe_chunked(texts, batch_size, n_process)
+    docs = get_nlp().pipe(texts, batch_size=batch_size, n_process=n_process)
+    return (entities_from_doc(doc) for doc in timed("ner", docs))
+
+# Same output as process_data, but all claims and docs go through nlp.pipe
+def process_data_batched(json_data, batch_size=BATCH_SIZE, n_process=N_PROCESS, cache=None):
+    return list(iter_processed(json_data, batch_size, n_process, cache))
+
+# Yields the tagged records one at a time, so they can be written as they come
+def iter_processed(json_data, batch_size=BATCH_SIZE, n_process=N_PROCESS, cache=None):
+    """Tag every claim and doc with nlp.pipe, keeping the entry order.
+
+    json_data can be any iterable of entries, including a lazy file reader.
+    Results come back in input order, so each entry produces exactly two
+    consecutive entity lists (claim, then doc) even when n_process > 1.
+    With a cache, only claims/docs whose text is not cached reach spaCy,
+    and at most one cache window of entries is held at a time.
+    In entity-only mode long docs are tagged in chunks and their entity
+    offsets mapped back onto the full text.
+    """
+    pending = deque()
+    entry_count = 0
+    start_time = time.perf_counter()
+
+    texts = _iter_texts(json_data, pending)
+    results = run_cached(texts, lambda uncached: _run_ner(uncached, batch_size, n_process), cache,
+                         cache_window(batch_size, n_process))
+    for claim_entities in results:
+        doc_entities = next(results)
+        entry = pending.popleft()
+        entry_count += 1
+        progress("entries")
+        yield build_record(entry, claim_entities, doc_entities)
+
+    report_throughput(entry_count, time.perf_counter() - start_time)
+    if cache is not None:
+        print(cache.report())
+
+# Prints how many texts per second went through spaCy
+def report_throughput(entry_count, elapsed):
+    doc_count = 2 * entry_count
+    rate = doc_count / elapsed if elapsed > 0 else 0.0
+    print(f"Tagged {entry_count} entries ({doc_count} docs) in {elapsed:.1f}s: {rate:.1f} docs/sec")
+
+# Tags one shard in a pool worker; the model stays loaded for the worker's next shard
+def process_shard(input_path, output_path, options):
+    global ENTITY_ONLY, CHUNK_CHARS
+    ENTITY_ONLY = options["entity_only"]
+    CHUNK_CHARS = options["chunk_chars"]
+
+    indices = deque()
+    def entries():
+        for index, entry in timed("read", iter_shard_input(input_path)):
+            indices.append(index)
+            yield entry
+
+    # Workers only read the shared cache; new results go to a file per shard
+    cache = None
+    if options["cache"]:
+        cache = ShardEntityCache(options["cache"], shard_cache_path(output_path), get_nlp(), cache_namespace())
+    try:
+        records = iter_processed(entries(), options["batch_size"], 1, cache)
+        return write_shard_output(output_path, ({"index": indices.popleft(), "record": record} for record in records))
+    finally:
+        if cache is not None:
+            cache.close()
+
+# Where the shard files of a sharded run are kept until its output is written
+def get_shard_dir(args):
+    return args.shard_dir or f"{args.output}.shards"
+
+# Splits the input by url, tags the shards in a process pool and yields the records in input order
+def iter_processed_sharded(args):
+    shard_dir = get_shard_dir(args)
+    options = {
+        "entity_only": ENTITY_ONLY,
+        "chunk_chars": CHUNK_CHARS,
+        "batch_size": args.batch_size,
+        "cache": args.cache,
+        "profile": bool(args.profile),
+    }
+    with stage("shard_pool"):
+        merged = run_sharded(args.input, shard_dir, args.shards, args.workers or args.shards, process_shard, options)
+    for record in merged:
+        yield record["record"]
+
+# Called once the output file is written: a failed write keeps the shards for a rerun
+def finish_sharded(args):
+    shard_dir = get_shard_dir(args)
+    if args.cache:
+        merge_caches(args.cache, shard_cache_paths(shard_dir, args.shards))
+    remove_shards(shard_dir, args.shards)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tag claims and documents with spaCy entities.")
+    parser.add_argument("--input", default=INPUT_PATH, help="JSON array or JSONL file with entries")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="Where to write the tagged records")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read entries one at a time and write each record as JSONL")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--n-process", type=int, default=N_PROCESS)
+    parser.add_argument("--cache", default=None,
+                        help="SQLite file that keeps entities of unchanged claims/docs between runs")
+    parser.add_argument("--entity-only", action="store_true",
+                        help="Load only the components that produce entities and tag long documents in chunks; "
+                             "faster, but entities at chunk edges can differ from the default run")
+    parser.add_argument("--chunk-chars", type=int, default=CHUNK_CHARS,
+                        help="Largest chunk tagged at once with --entity-only")
+    parser.add_argument("--cold-start", action="store_true",
+                        help="Only report import and model load time, then exit")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="Split the input into this many shards by url and tag them in a process pool")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for --shards (default: one per shard)")
+    parser.add_argument("--shard-dir", default=None,
+                        help="Where shard files are kept until the merge (default: <output>.shards); "
+                             "rerun with the same directory to retry only failed shards")
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global ENTITY_ONLY, CHUNK_CHARS
+    args = parse_args(argv)
+    ENTITY_ONLY = args.entity_only
+    CHUNK_CHARS = args.chunk_chars
+
+    if args.cold_start:
+        print(cold_start_report(IMPORT_SECONDS, MODEL_NAME, ENTITY_ONLY))
+        return
+
+    start_profile(args.profile, args.profile_stage)
+    if args.shards:
+        records = iter_processed_sharded(args)
+        if args.stream:
+            with stage("write"):
+                write_jsonl(args.output, records)
+        else:
+            processed_data = list(records)
+            with stage("write"), open(args.output, 'w') as outfile:
+                json.dump(processed_data, outfile, indent=4)
+        finish_sharded(args)
+        print(f"Data has been processed and saved to {args.output}")
+        finish_profile(args.profile, {"script": "Process_Claims_Doc", "shards": args.shards})
+        return
+
+    cache = EntityCache(args.cache, get_nlp(), cache_namespace()) if args.cache else None
+
+    if args.stream:
+        # Memory stays flat: entries are read lazily and records written as soon as they are tagged
+        entries = timed("read", iter_json_records(args.input))
+        with stage("write"):
+            write_jsonl(args.output, iter_processed(entries, args.batch_size, args.n_process, cache))
+    else:
+        # Loads the data
+        with stage("read"), open(args.input, 'r') as file:
+            data = json.load(file)
+
+        processed_data = process_data_batched(data, args.batch_size, args.n_process, cache)
+        with stage("write"), open(args.output, 'w') as outfile:
+            json.dump(processed_data, outfile, indent=4)
+
+    if cache is not None:
+        cache.close()
+
+    # Shows output location
+    print(f"Data has been processed and saved to {args.output}")
+    finish_profile(args.profile, {"script": "Process_Claims_Doc"})
 
-processed_data = process_data(data)
-#Allocates where the output is
-output_filename = '../../../data/Processed/tagged/spaCy_Results.json'
-with open(output_filename, 'w') as outfile:
-    json.dump(processed_data, outfile, indent=4)
+IMPORT_SECONDS = time.perf_counter() - _import_started
 
-# Shows output location
-print(f"Data has been processed and saved to {output_filename}")
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,61 @@
 import prodigy
-from prodigy.components.preprocess import add_tokens
 from prodigy import set_hashes
-import json
+from prodigy.components.db import connect
+from collections import defaultdict
+import sys
 from pathlib import Path
 import spacy
 
+# Shared helpers live in the code/ directory next to this one
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from corpus_store import iter_corpus
+from ner_tasks import NUMERICAL_LABELS, iter_ner_tasks
+from token_cache import attach_tokens, default_token_cache_path, open_token_cache
+from resume_index import HashIndex, skip_annotated
+from instrumentation import count_tasks, finish_profile, start_profile, timed
+
 
 
 
 @prodigy.recipe(
     "NER_annotation",
     dataset=prodigy.core.Arg(help="Dataset to save annotations."),
-    file_path=prodigy.core.Arg(help="Path to the JSON file with claims and documents.")
+    file_path=prodigy.core.Arg(help="Path to the JSON or JSONL file with claims and documents, or its .corpus.sqlite store."),
+    token_store=prodigy.core.Arg("--tokens", "-t", help="Token store from pretokenize.py (defaults to <file_path>.tokens.sqlite)"),
+    annotators=prodigy.core.Arg("--annotators", "-a", help="Comma-separated annotator names served by this one process, e.g. Person1,Person2,Person3"),
+    profile=prodigy.core.Arg("--profile", help="Write a JSON report of per-stage timings, counters and peak RSS here when the server stops"),
+    profile_stage=prodigy.core.Arg("--profile-stage", help="Also write a cProfile dump of this stage to <profile>.prof")
 )
-def NER_annotation(dataset: str, file_path: Path):
-    """Annotate named entities and relations in a claim and document."""
-    # Load the JSON file
-    with open(file_path, 'r', encoding="utf-8") as file:
-        data = json.load(file)
+def NER_annotation(dataset: str, file_path: Path, token_store: str = None, annotators: str = None,
+                   profile: str = None, profile_stage: str = None):
+    """Annotate named entities and relations in a claim and document.
+
+    With --annotators, one process serves every named annotator (open the app
+    with ?session=<name>) from a single shared stream, and each answer is also
+    saved to the per-annotator dataset <dataset>_<name>.
 
+    With --profile, the time spent reading the corpus, building tasks,
+    tokenizing and hashing them is reported when the server stops.
+    """
+    start_profile(profile, profile_stage)
     # Initialize spaCy model for tokenization
     nlp = spacy.blank("en")  # Using blank model to add tokens
 
-    # Define numerical labels
-    NUMERICAL_LABELS = ["CARDINAL", "MONEY", "PERCENT", "QUANTITY", "TIME", "DATE", "ORDINAL"]
-
-    # Prepare the stream of tasks
-    stream = []
-    for url, content in data.items():
-
-        # Defining the data and the prefixes
-        claim = content['claim']
-        claim_entities = content.get('claim_entities', [])
-        doc = content['doc']
-        doc_entities = content.get('doc_entities', [])
-        
-        label = content.get('label', '')
-        label_prefix = "Label: "
-
-        claim_prefix = "\n\nClaim: "
-        doc_prefix = "\n\nDocument: "
-
-        FeedbackInstructions = "\n\nInstructions: Any additional issues or information required please input that in the box bellow"
-
-        # Is essentially the order of the content in the stream
-        combined_text = f"{label_prefix}{label}{claim_prefix}{claim}{doc_prefix}{doc}{FeedbackInstructions}"
-
-        # Important, as it keeps track of what extra has been added so that spans are correct
-        claim_offset = len(claim_prefix)+len(label_prefix)+len(label)
- 
-        adjusted_claim_entities = [
-            {
-                "start": entity["start"] + claim_offset,
-                "end": entity["end"] + claim_offset,
-                "label": entity["label"],
-                "text": claim[entity["start"]:entity["end"]]
-            }
-            for entity in claim_entities
-        ]
-
-        # Caluclating the same but for everything that comes before the document
-        doc_offset = len(f"{label_prefix}{label}{claim_prefix}{claim}{doc_prefix}")
-        adjusted_doc_entities = [
-            {
-                "start": entity["start"] + doc_offset,
-                "end": entity["end"] + doc_offset,
-                "label": entity["label"],
-                "text": doc[entity["start"]:entity["end"]]
-            }
-            for entity in doc_entities
-        ]
-
-        # Build the complete list of spans (first claim then document entities)
-        spans = adjusted_claim_entities + adjusted_doc_entities
-
-        # Filter numerical spans
-        numerical_spans = [span for span in spans if span["label"] in NUMERICAL_LABELS]
-
-        # Creates the annotation task
-        task = {
-            "text": combined_text,
-            "meta": {"url": url},
-            "spans": spans,
-            "numerical_spans": numerical_spans  # Store filtered numerical spans
-        }
+    # Tasks are built and tokenized on demand while Prodigy pulls from the
+    # stream, so the first task is served without reading the whole corpus
+    stream = timed("tasks", iter_ner_tasks(timed("read", iter_corpus(file_path))))
 
-        stream.append(task)
+    # Completed tasks are dropped here, before they are tokenized or rendered
+    db = connect()
+    names = [name.strip() for name in annotators.split(",") if name.strip()] if annotators else []
+    done = load_completed_hashes(db, dataset, names)
+    print(f"Resume: {len(done)} completed tasks indexed for {dataset}")
+    stream = timed("resume", skip_annotated(stream, done, set_input_hash))
 
-    # Uses add_tokens() for proper tokenization (like ner_manual)
-    stream = add_tokens(nlp, stream)
-    stream = (set_hashes(eg) for eg in stream)
+    # Tokens come from the pre-tokenized store; only missing tasks are tokenized here
+    token_cache = open_token_cache(token_store or default_token_cache_path(file_path))
+    stream = timed("tokenization", attach_tokens(nlp, stream, token_cache))
+    stream = count_tasks(timed("hashing", (set_hashes(eg) for eg in stream)))
 
     # Define blocks for UI layout
     blocks = [
@@ -118,13 +84,77 @@ def NER_annotation(dataset: str, file_path: Path):
         {"view_id": "text_input"}
     ]
 
-    return {
+    components = {
         "dataset": dataset,
         "view_id": "blocks",  # Combination of the different blocks 
         "stream": stream, 
         "config": {
             "blocks": blocks,
-            "labels": ["CARDINAL", "MONEY", "PERCENT", "QUANTITY", "TIME", "DATE", "ORDINAL"],
+            "labels": NUMERICAL_LABELS,
         }
 
-    }
\ No newline at end of file
+    }
+
+    if profile:
+        components["on_exit"] = lambda ctrl: finish_profile(profile, {"recipe": "NER_annotation"})
+
+    if names:
+        # Every annotator gets every task from the one shared stream
+        components["config"]["feed_overlap"] = True
+        components["update"] = make_annotator_router(db, dataset, names)
+
+    return components
+
+
+def set_input_hash(task):
+    """Compute and store the task's input hash without hashing its tokens.
+
+    The input hash only depends on the text, so it is the same before and
+    after tokenization; the task hash is still set later by set_hashes.
+    """
+    task["_input_hash"] = set_hashes(dict(task))["_input_hash"]
+    return task["_input_hash"]
+
+
+def load_completed_hashes(db, dataset: str, names) -> HashIndex:
+    """Index the input hashes of tasks that need no more annotation.
+
+    With named annotators a task is complete once every annotator's dataset
+    has it; otherwise once the target dataset has it.
+    """
+    datasets = [annotator_dataset(dataset, name) for name in names] or [dataset]
+    done = None
+    for name in datasets:
+        hashes = HashIndex(db.get_input_hashes(name) if name in db else ())
+        done = hashes if done is None else done.intersection(hashes)
+    return done
+
+
+def annotator_dataset(dataset: str, name: str) -> str:
+    """Name of the per-annotator dataset, e.g. NER_Annotated_Person1."""
+    return f"{dataset}_{name}"
+
+
+def make_annotator_router(db, dataset: str, names):
+    """Return an update callback that copies answers to per-annotator datasets.
+
+    Prodigy stores named-session answers with _session_id "<dataset>-<name>";
+    the callback uses that to add them to <dataset>_<name> as well, so
+    CombineNerAnnotations and the relation recipe keep seeing one dataset
+    per annotator.
+    """
+    for name in names:
+        db.add_dataset(annotator_dataset(dataset, name))
+    session_prefix = f"{dataset}-"
+
+    def update(answers):
+        by_annotator = defaultdict(list)
+        for eg in answers:
+            session = eg.get("_session_id") or ""
+            name = session[len(session_prefix):] if session.startswith(session_prefix) else session
+            if name in names:
+                by_annotator[name].append(eg)
+        for name, egs in by_annotator.items():
+            db.add_examples(egs, datasets=[annotator_dataset(dataset, name)])
+
+    return update
\ No newline at end of file
@@ -1,84 +1,88 @@
 import prodigy
 from prodigy.components.db import connect
-from prodigy.components.preprocess import add_tokens
+import os
 import spacy
-import html
-import re
-# the Numerical Labels we are using
-NUMERICAL_LABELS = ["CARDINAL", "MONEY", "PERCENT", "QUANTITY", "TIME", "DATE", "ORDINAL"]
-
-@prodigy.recipe("numerical_relations", dataset=prodigy.core.Arg(help="Dataset to save annotations."))
-def numerical_relations(dataset: str):
-    nlp = spacy.blank("en")
-    db = connect()
-    examples = db.get_dataset("NER_Annotated_Person1")
+import sys
+from pathlib import Path
 
-    stream = []
-
-    def highlight_claim(text):
-        # Used to highlight the text in the claim
-        match = re.search(r"(Claim:\s*)(.+?)(\s*Document:)", text, re.IGNORECASE | re.DOTALL)
-        if match:
-            before = html.escape(match.group(1))
-            claim = match.group(2)  
-            after = html.escape(match.group(3))
-            highlighted = f"{before}<span style='background-color: #d0ebff'>{claim}</span>{after}"
-            return text.replace(match.group(0), highlighted)
-        else:
-            return html.escape(text)
-
-    def highlight_numericals(text, spans):
-        spans = sorted(spans, key=lambda s: s["start"])
-        result = ""
-        last_end = 0
-        for s in spans:
-            result += html.escape(text[last_end:s["start"]])
-            result += f"<mark style='background-color: #ffcc80'>{html.escape(text[s['start']:s['end']])}</mark>"
-            last_end = s["end"]
-        result += html.escape(text[last_end:])
-        return result
+# Shared helpers live in the code/ directory next to this one
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from token_cache import align_spans, get_tokens, open_token_cache
+from resume_index import HashIndex, skip_annotated
+from annotation_sources import DEFAULT_SOURCES, iter_source_examples, parse_sources
+# the Numerical Labels we are using
+from ner_tasks import NUMERICAL_LABELS
+from relation_tasks import build_relation_task, lazy_context_js
+from context_server import ContextStore, serve_contexts
+from instrumentation import count_tasks, finish_profile, stage, start_profile, timed
 
-    for eg in examples:
-        text = eg["text"]
-        spans = eg.get("spans", [])
-        tokens = eg.get("tokens", [])
+@prodigy.recipe(
+    "numerical_relations",
+    dataset=prodigy.core.Arg(help="Dataset to save annotations."),
+    token_store=prodigy.core.Arg("--tokens", "-t", help="Token store from pretokenize.py, used for examples without tokens"),
+    source=prodigy.core.Arg("--source", "-s", help="Comma-separated NER datasets, merged JSONL files or corpus stores to read, first one wins on duplicates"),
+    window=prodigy.core.Arg("--window", "-w", help="Only send this many characters of document context around each numerical span; the full context loads when expanded"),
+    context_port=prodigy.core.Arg("--context-port", help="Port the full context of windowed tasks is served on (default: any free port)"),
+    context_url=prodigy.core.Arg("--context-url", help="Address the browser reaches the context server at, e.g. through an HTTPS reverse proxy"),
+    propose=prodigy.core.Arg("--propose", "-p", help="Pre-fill MATCHES/INCONSISTENT relations between claim and document numbers as suggestions"),
+    profile=prodigy.core.Arg("--profile", help="Write a JSON report of per-stage timings, counters and peak RSS here when the server stops"),
+    profile_stage=prodigy.core.Arg("--profile-stage", help="Also write a cProfile dump of this stage to <profile>.prof")
+)
+def numerical_relations(dataset: str, token_store: str = None, source: str = DEFAULT_SOURCES, window: int = None,
+                        context_port: int = 0, context_url: str = None, propose: bool = False, profile: str = None, profile_stage: str = None):
+    """Annotate relations between the numerical entities of saved NER examples.
 
-        numerical_spans = [s for s in spans if s["label"] in NUMERICAL_LABELS]
+    Examples are read lazily from every source in --source (per-annotator
+    datasets by default, or an adjudicated dataset / merged file), so the
+    first task is served before the sources have been read completely.
 
-        numerical_tokens = [
-            t for t in tokens
-            if any(s["start"] <= t["start"] < s["end"] for s in numerical_spans)
-        ]
+    With --window, a task carries the claim and a window of context around
+    each numerical span instead of the whole document. The full document
+    is served by a small context server on --context-port and only fetched
+    when the annotator opens it. Requests need a token that only the
+    annotation page gets, and behind HTTPS the server must be proxied and
+    its address given as --context-url. With --propose,
+    claim numbers that match (or nearly match) document numbers come with
+    suggested relations the annotator can keep or delete.
 
-        # Generate collapsible HTML
-        highlighted_text = highlight_numericals(text, numerical_spans)
-        combined_html = highlight_claim(highlighted_text)
+    With --profile, the time spent reading examples, tokenizing and
+    rendering tasks is reported when the server stops.
+    """
+    start_profile(profile, profile_stage)
+    nlp = spacy.blank("en")
+    token_cache = open_token_cache(token_store)
+    db = connect()
+    sources = parse_sources(source)
+    print(f"Relation sources: {', '.join(sources)}")
+    examples = timed("read", iter_source_examples(db, sources))
 
-        html_block = f"""
-            <details style="margin-top:10px;">
-                <summary><strong>Show Full Context</strong></summary>
-                <div style='white-space: pre-wrap; font-family: monospace; font-size: 14px; padding: 12px; border-top: 1px solid #ddd; background: #f9f9f9;'>
-                    {combined_html}
-                </div>
-            </details>
-        """
+    # Relation tasks keep the NER example's input hash, so completed ones can
+    # be dropped before their HTML is rendered
+    done = HashIndex(db.get_input_hashes(dataset) if dataset in db else ())
+    print(f"Resume: {len(done)} completed tasks indexed for {dataset}")
+    examples = skip_annotated(examples, done, lambda eg: eg.get("_input_hash"))
 
-        task = {
-            "text": text,
-            "tokens": numerical_tokens,
-            "spans": numerical_spans,
-            "relations": [],
-            "_input_hash": eg.get("_input_hash"),
-            "html": html_block
-        }
+    contexts = server = None
+    if window is not None:
+        contexts = ContextStore()
+        server = serve_contexts(contexts, os.environ.get("PRODIGY_HOST", "localhost"), int(context_port or 0))
+        print(f"Full contexts served on port {server.server_address[1]}")
 
-        task = list(add_tokens(nlp, [task]))[0]
-        stream.append(task)
+    def get_stream():
+        for eg in examples:
+            text = eg["text"]
+            # Saved NER examples carry their tokens; older ones are looked up or tokenized once
+            with stage("tokenization"):
+                tokens = eg.get("tokens") or get_tokens(nlp, text, token_cache)
+                align_spans(eg.get("spans", []), tokens)
+            with stage("rendering"):
+                task = build_relation_task(eg, tokens, window, propose, contexts)
+            yield task
 
-    return {
+    components = {
         "dataset": dataset,
         "view_id": "blocks",
-        "stream": stream,
+        "stream": count_tasks(get_stream()),
         "config": {
             "blocks": [
                 {"view_id": "relations"},
@@ -89,3 +93,16 @@ def numerical_relations(dataset: str):
             "relations_span_labels": NUMERICAL_LABELS
         }
     }
+
+    if server is not None:
+        components["config"]["javascript"] = lazy_context_js(server.server_address[1], server.token, context_url)
+
+    def on_exit(ctrl):
+        if server is not None:
+            server.shutdown()
+            contexts.close()
+        finish_profile(profile, {"recipe": "numerical_relations"})
+
+    components["on_exit"] = on_exit
+
+    return components
@@ -0,0 +1,189 @@
+"""Inter-annotator agreement on NER spans and the numerical choice, computed with NumPy."""
+
+import json
+from array import array
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Choice options of the NER recipe; an answer with neither counts as a third category
+CHOICE_OPTIONS = ("numerical", "not_numerical")
+
+
+def kappa(confusion: np.ndarray) -> Optional[float]:
+    """Cohen's kappa of a square confusion matrix, or None without data."""
+    total = confusion.sum()
+    if total == 0:
+        return None
+    observed = np.trace(confusion) / total
+    expected = (confusion.sum(axis=0) @ confusion.sum(axis=1)) / total ** 2
+    if expected == 1:
+        return 1.0
+    return float((observed - expected) / (1 - expected))
+
+
+def fleiss_kappa(ratings: np.ndarray, categories: int) -> Optional[float]:
+    """Fleiss' kappa for units rated by a varying number of annotators.
+
+    Args:
+        ratings: (units, annotators) category indices, -1 where the
+            annotator did not rate the unit.
+        categories (int): Number of categories.
+    """
+    rated = ratings >= 0
+    raters = rated.sum(axis=1)
+    ratings, rated, raters = ratings[raters >= 2], rated[raters >= 2], raters[raters >= 2]
+    if len(ratings) == 0:
+        return None
+    units = np.repeat(np.arange(len(ratings)), rated.sum(axis=1))
+    counts = np.bincount(units * categories + ratings[rated], minlength=len(ratings) * categories)
+    counts = counts.reshape(len(ratings), categories)
+
+    unit_agreement = ((counts * (counts - 1)).sum(axis=1) / (raters * (raters - 1))).mean()
+    shares = counts.sum(axis=0) / counts.sum()
+    expected = (shares ** 2).sum()
+    if expected == 1:
+        return 1.0
+    return float((unit_agreement - expected) / (1 - expected))
+
+
+def pairwise_confusions(ratings: np.ndarray, categories: int) -> Dict[tuple, np.ndarray]:
+    """Confusion matrix of every annotator pair over the units both rated."""
+    confusions = {}
+    for a, b in combinations(range(ratings.shape[1]), 2):
+        both = (ratings[:, a] >= 0) & (ratings[:, b] >= 0)
+        codes = ratings[both, a] * categories + ratings[both, b]
+        confusions[(a, b)] = np.bincount(codes, minlength=categories ** 2).reshape(categories, categories)
+    return confusions
+
+
+def safe_ratio(numerator: float, denominator: float) -> Optional[float]:
+    return float(numerator / denominator) if denominator else None
+
+
+class AgreementCollector:
+    """Collects spans and choices per annotator, then scores them in one go.
+
+    Spans are stored in ``annotation_key`` form as flat integer arrays (item,
+    annotator, start, end, label), so adding an example costs a few appends
+    and the scoring runs as NumPy operations over all spans at once.
+    """
+
+    def __init__(self, annotators: Sequence[str]):
+        self.annotators = list(annotators)
+        self.items: Dict[Any, int] = {}
+        self.labels: Dict[str, int] = {}
+        self.span_columns = [array("q") for _ in range(5)]
+        self.seen = [array("q"), array("q")]  # item, annotator
+        self.choices = array("q")  # choice index per entry of self.seen
+
+    def add(self, annotator: int, key, eg: Dict[str, Any]) -> None:
+        """Record one annotator's example for the input with the given key."""
+        item = self.items.setdefault(key, len(self.items))
+        self.seen[0].append(item)
+        self.seen[1].append(annotator)
+        accepted = [option for option in CHOICE_OPTIONS if option in (eg.get("accept") or [])]
+        self.choices.append(CHOICE_OPTIONS.index(accepted[0]) if accepted else len(CHOICE_OPTIONS))
+        for span in eg.get("spans", []):
+            label = self.labels.setdefault(span["label"], len(self.labels))
+            for column, value in zip(self.span_columns, (item, annotator, span["start"], span["end"], label)):
+                column.append(value)
+
+    def seen_matrix(self, fill: np.ndarray) -> np.ndarray:
+        """(items, annotators) matrix with ``fill`` where seen and -1 elsewhere."""
+        matrix = np.full((len(self.items), len(self.annotators)), -1, dtype=np.int64)
+        matrix[np.asarray(self.seen[0]), np.asarray(self.seen[1])] = fill
+        return matrix
+
+    def span_ratings(self) -> np.ndarray:
+        """(units, annotators) label index per candidate span.
+
+        A unit is an (item, start, end) extent that any annotator marked.
+        Annotators who saw the item but did not mark the extent rate it
+        "no span" (the last category); annotators who did not see it get -1.
+        """
+        item, annotator, start, end, label = (np.asarray(column, dtype=np.int64) for column in self.span_columns)
+        if len(item) == 0:
+            return np.empty((0, len(self.annotators)), dtype=np.int64)
+        extents = np.stack([item, start, end], axis=1)
+        units, unit_of_span = np.unique(extents, axis=0, return_inverse=True)
+        unit_of_span = unit_of_span.reshape(-1)
+
+        seen = self.seen_matrix(len(self.labels))
+        ratings = seen[units[:, 0]]
+        ratings[unit_of_span, annotator] = label
+        return ratings
+
+    def span_agreement(self) -> Dict[str, Any]:
+        categories = len(self.labels) + 1
+        ratings = self.span_ratings()
+        confusions = pairwise_confusions(ratings, categories)
+
+        total = sum(confusions.values(), np.zeros((categories, categories), dtype=np.int64))
+        true_positives = np.diag(total)
+        reference, predicted = total.sum(axis=1), total.sum(axis=0)
+        per_label = {}
+        for label, index in self.labels.items():
+            tp = true_positives[index]
+            per_label[label] = {
+                "precision": safe_ratio(tp, predicted[index]),
+                "recall": safe_ratio(tp, reference[index]),
+                "f1": safe_ratio(2 * tp, predicted[index] + reference[index]),
+                "support": int(reference[index] + predicted[index]),
+            }
+
+        return {
+            "units": int(len(ratings)),
+            "fleiss_kappa": fleiss_kappa(ratings, categories),
+            "pairwise_kappa": self.by_pair(confusions),
+            "per_label": per_label,
+        }
+
+    def choice_agreement(self) -> Dict[str, Any]:
+        categories = len(CHOICE_OPTIONS) + 1
+        ratings = self.seen_matrix(np.asarray(self.choices, dtype=np.int64))
+        confusions = pairwise_confusions(ratings, categories)
+        total = sum(confusions.values(), np.zeros((categories, categories), dtype=np.int64))
+        return {
+            "items": int(((ratings >= 0).sum(axis=1) >= 2).sum()),
+            "percent_agreement": safe_ratio(np.trace(total), total.sum()),
+            "fleiss_kappa": fleiss_kappa(ratings, categories),
+            "pairwise_kappa": self.by_pair(confusions),
+        }
+
+    def by_pair(self, confusions: Dict[tuple, np.ndarray]) -> Dict[str, Optional[float]]:
+        return {f"{self.annotators[a]}|{self.annotators[b]}": kappa(m) for (a, b), m in confusions.items()}
+
+    def report(self) -> Dict[str, Any]:
+        """Compute the full agreement report.
+
+        Span precision/recall/F1 count exact (start, end, label) matches over
+        every annotator pair, on the items both annotators saw; the first
+        annotator of a pair is treated as the reference.
+        """
+        return {
+            "annotators": self.annotators,
+            "items": len(self.items),
+            "spans": len(self.span_columns[0]),
+            "span_agreement": self.span_agreement(),
+            "choice_agreement": self.choice_agreement(),
+        }
+
+
+def write_report(report: Dict[str, Any], path) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+def fmt(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:.3f}"
+
+
+def summary(report: Dict[str, Any]) -> List[str]:
+    """Short lines for the console, one per headline number."""
+    spans, choices = report["span_agreement"], report["choice_agreement"]
+    lines = [f"Span Fleiss' kappa: {fmt(spans['fleiss_kappa'])} over {spans['units']} candidate spans"]
+    lines += [f"  {label}: F1 {fmt(scores['f1'])}" for label, scores in sorted(spans["per_label"].items())]
+    lines.append(f"Choice Fleiss' kappa: {fmt(choices['fleiss_kappa'])} over {choices['items']} items")
+    return lines
@@ -0,0 +1,80 @@
+"""Stream saved NER examples from Prodigy datasets or exported JSONL files."""
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+from corpus_store import CORPUS_SUFFIX, CorpusStore, is_corpus_store
+from json_stream import iter_json_records
+
+DEFAULT_SOURCES = "NER_Annotated_Person1,NER_Annotated_Person2,NER_Annotated_Person3"
+FILE_SUFFIXES = (".json", ".jsonl", ".ndjson", CORPUS_SUFFIX)
+
+
+def parse_sources(sources: str) -> List[str]:
+    """Split a comma-separated list of dataset names and file paths."""
+    return [source.strip() for source in sources.split(",") if source.strip()]
+
+
+def is_file_source(source: str) -> bool:
+    """A source is read from disk when it is a JSON(L) or store path, or an existing file."""
+    return source.endswith(FILE_SUFFIXES) or Path(source).is_file()
+
+
+def iter_dataset(db, name: str) -> Iterator[Dict[str, Any]]:
+    """Yield the examples of one dataset without loading it into a list first.
+
+    Prodigy's ``iter_dataset_examples`` reads the dataset from the database
+    in pages. Older database classes only offer ``get_dataset``, which is
+    used as a fallback.
+    """
+    if name not in db:
+        print(f"Source dataset '{name}' does not exist, skipping it")
+        return
+    iter_examples = getattr(db, "iter_dataset_examples", None)
+    if iter_examples is not None:
+        yield from iter_examples(name)
+    else:
+        yield from db.get_dataset(name) or []
+
+
+def iter_store(path) -> Iterator[Dict[str, Any]]:
+    """Yield the examples kept in a corpus store, in their original order."""
+    store = CorpusStore(path)
+    try:
+        for _, eg in store.iter_records():
+            yield eg
+    finally:
+        store.close()
+
+
+def iter_source(db, source: str) -> Iterator[Dict[str, Any]]:
+    """Yield the examples of a dataset name, an exported JSON(L) file or a corpus store."""
+    if is_corpus_store(source):
+        yield from iter_store(source)
+    elif is_file_source(source):
+        yield from iter_json_records(source)
+    else:
+        yield from iter_dataset(db, source)
+
+
+def iter_source_examples(db, sources: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Yield the examples of several sources, one per input hash.
+
+    Sources are read one after another, in the given order, so an
+    adjudicated dataset listed first wins over the per-annotator ones.
+    An input that several annotators saved is only yielded the first time
+    it is seen.
+
+    Args:
+        db: Prodigy database, used for dataset sources.
+        sources: Dataset names or paths of exported JSON(L) files.
+    """
+    seen = set()
+    for source in sources:
+        for eg in iter_source(db, source):
+            input_hash = eg.get("_input_hash")
+            if input_hash is not None:
+                if input_hash in seen:
+                    continue
+                seen.add(input_hash)
+            yield eg
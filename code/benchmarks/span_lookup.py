@@ -0,0 +1,77 @@
+"""Compare the old and new numerical span/token lookup on long synthetic documents.
+
+Usage:
+    python code/benchmarks/span_lookup.py [--words 20000] [--spans 200] [--repeat 3]
+"""
+
+import argparse
+import html
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from relation_tasks import highlight_numericals, tokens_in_spans
+
+
+def make_document(word_count: int, span_count: int, seed: int = 0):
+    """Return text, tokens and non-overlapping numerical spans."""
+    rng = random.Random(seed)
+    words = [rng.choice(["the", "rate", "rose", "by", "12", "percent", "$4", "billion"]) for _ in range(word_count)]
+    tokens, position = [], 0
+    for i, word in enumerate(words):
+        tokens.append({"text": word, "start": position, "end": position + len(word), "id": i, "ws": True})
+        position += len(word) + 1
+    text = " ".join(words)
+    picked = sorted(rng.sample(range(0, word_count - 2, 3), span_count))
+    spans = [{"start": tokens[i]["start"], "end": tokens[i + 1]["end"], "label": "CARDINAL"} for i in picked]
+    return text, tokens, spans
+
+
+def old_tokens_in_spans(tokens, spans):
+    return [t for t in tokens if any(s["start"] <= t["start"] < s["end"] for s in spans)]
+
+
+def old_highlight_numericals(text, spans):
+    spans = sorted(spans, key=lambda s: s["start"])
+    result = ""
+    last_end = 0
+    for s in spans:
+        result += html.escape(text[last_end:s["start"]])
+        result += f"<mark style='background-color: #ffcc80'>{html.escape(text[s['start']:s['end']])}</mark>"
+        last_end = s["end"]
+    result += html.escape(text[last_end:])
+    return result
+
+
+def best_of(repeat, func, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", type=int, default=20000)
+    parser.add_argument("--spans", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text, tokens, spans = make_document(args.words, args.spans)
+    for name, old, new, inputs in [
+        ("token lookup", old_tokens_in_spans, tokens_in_spans, (tokens, spans)),
+        ("html render", old_highlight_numericals, highlight_numericals, (text, spans)),
+    ]:
+        old_time, old_result = best_of(args.repeat, old, *inputs)
+        new_time, new_result = best_of(args.repeat, new, *inputs)
+        assert old_result == new_result, f"{name}: results differ"
+        print(f"{name}: old {old_time * 1000:.1f} ms, new {new_time * 1000:.1f} ms, "
+              f"{old_time / new_time:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Measure how long NER_annotation takes to serve its first task.
+
+Usage:
+    python code/benchmarks/stream_startup.py data/processed/tagged/spaCy_Results.json
+    python code/benchmarks/stream_startup.py <file> --eager   # materialise the whole stream first
+"""
+
+import argparse
+import resource
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "Recipe"))
+from Ner_Recipe import NER_annotation
+
+
+def peak_rss_mb() -> float:
+    """Return the peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file_path", help="Tagged corpus (JSON or JSONL)")
+    parser.add_argument("--eager", action="store_true",
+                        help="Build every task before serving, like the old list-based recipe")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    components = NER_annotation("stream_startup_benchmark", args.file_path)
+    stream = components["stream"]
+    if args.eager:
+        stream = iter(list(stream))
+    next(iter(stream))
+    elapsed = time.perf_counter() - started
+
+    mode = "eager" if args.eager else "lazy"
+    print(f"{mode}: first task after {elapsed:.3f}s, peak RSS {peak_rss_mb():.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Cascaded NER: a cheap scan decides which sentences reach the transformer."""
+
+from collections import deque
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from spacy.language import Language
+from spacy.tokens import Doc
+
+from text_chunks import split_into_sentences
+
+SCANNERS = ("rules", "sm")
+
+# (start_char, end_char, label)
+CharSpan = Tuple[int, int, str]
+
+
+class CascadeNER:
+    """Run an expensive NER model only on sentences with numeric candidates.
+
+    With the "rules" scanner a sentence is a candidate when ``detector``
+    returns True for it. With the "sm" scanner ``fast_nlp`` tags every text
+    first and a sentence is a candidate when it holds one of
+    ``target_entities``. Only candidate sentences are passed to ``nlp``;
+    its entities win over the scanner's where the two overlap.
+    """
+
+    def __init__(
+        self,
+        nlp: Language,
+        target_entities: Set[str],
+        scanner: str = "rules",
+        detector: Optional[Callable[[str], bool]] = None,
+        fast_nlp: Optional[Language] = None,
+    ):
+        """Set up the cascade.
+
+        Args:
+            nlp (Language): The expensive model, e.g. en_core_web_trf.
+            target_entities (set): Entity labels that are kept.
+            scanner (str): "rules" or "sm".
+            detector: Rule-based candidate test, required for "rules".
+            fast_nlp (Language): The cheap model, required for "sm".
+        """
+        if scanner not in SCANNERS:
+            raise ValueError(f"Unknown cascade scanner {scanner!r}, use one of {SCANNERS}")
+        if scanner == "rules" and detector is None:
+            raise ValueError("The 'rules' scanner needs a detector")
+        if scanner == "sm" and fast_nlp is None:
+            raise ValueError("The 'sm' scanner needs a fast_nlp model")
+        self.nlp = nlp
+        self.target_entities = target_entities
+        self.scanner = scanner
+        self.detector = detector
+        self.fast_nlp = fast_nlp
+        self.total_chars = 0
+        self.expensive_chars = 0
+        self.total_sentences = 0
+        self.expensive_sentences = 0
+
+    def _scan(self, texts: Iterable[str], batch_size: int) -> Iterator[Tuple[str, List[CharSpan]]]:
+        """Yield each text with the target entities found by the scanner."""
+        if self.scanner == "rules":
+            for text in texts:
+                yield text, []
+            return
+        for doc in self.fast_nlp.pipe(texts, batch_size=batch_size):
+            spans = [
+                (ent.start_char, ent.end_char, ent.label_)
+                for ent in doc.ents
+                if ent.label_ in self.target_entities
+            ]
+            yield doc.text, spans
+
+    def _is_candidate(self, start: int, sentence: str, fast_spans: List[CharSpan]) -> bool:
+        if self.scanner == "rules":
+            return self.detector(sentence)
+        end = start + len(sentence)
+        return any(span_start < end and start < span_end for span_start, span_end, _ in fast_spans)
+
+    def _iter_candidates(self, texts: Iterable[str], pending: deque, batch_size: int) -> Iterator[str]:
+        """Yield candidate sentences, queueing one work item per text."""
+        for text, fast_spans in self._scan(texts, batch_size):
+            sentences = split_into_sentences(text)
+            candidates = [
+                (start, sentence)
+                for start, sentence in sentences
+                if self._is_candidate(start, sentence, fast_spans)
+            ]
+            self.total_chars += len(text)
+            self.total_sentences += len(sentences)
+            self.expensive_sentences += len(candidates)
+            self.expensive_chars += sum(len(sentence) for _, sentence in candidates)
+            offsets = deque(start for start, _ in candidates)
+            pending.append({"text": text, "fast": fast_spans, "offsets": offsets, "spans": []})
+            for _, sentence in candidates:
+                yield sentence
+
+    def _build_doc(self, item: dict) -> Doc:
+        """Tokenize the full text and set the merged entities on it."""
+        doc = self.nlp.make_doc(item["text"])
+        taken = set()
+        ents = []
+        # Expensive-model spans first, so they win any overlap
+        for start, end, label in item["spans"] + item["fast"]:
+            span = doc.char_span(start, end, label=label, alignment_mode="expand")
+            if span is None or any(i in taken for i in range(span.start, span.end)):
+                continue
+            taken.update(range(span.start, span.end))
+            ents.append(span)
+        doc.ents = sorted(ents, key=lambda span: span.start)
+        return doc
+
+    def pipe(self, texts: Iterable[str], batch_size: int = 64) -> Iterator[Doc]:
+        """Yield one Doc per text, in order, carrying the merged entities.
+
+        The returned docs hold tokens and ``doc.ents`` only; they are built
+        with the expensive model's tokenizer, so token indices match what a
+        full run of that model would produce.
+        """
+        pending = deque()
+        candidates = self._iter_candidates(texts, pending, batch_size)
+        for sentence_doc in self.nlp.pipe(candidates, batch_size=batch_size):
+            # Texts with no (more) candidates at the head are complete
+            while len(pending[0]["offsets"]) == 0:
+                yield self._build_doc(pending.popleft())
+            item = pending[0]
+            offset = item["offsets"].popleft()
+            item["spans"].extend(
+                (ent.start_char + offset, ent.end_char + offset, ent.label_)
+                for ent in sentence_doc.ents
+                if ent.label_ in self.target_entities
+            )
+            if not item["offsets"]:
+                yield self._build_doc(pending.popleft())
+        while pending:
+            yield self._build_doc(pending.popleft())
+
+    def report(self) -> str:
+        """Return how much of the text reached the expensive model."""
+        share = 100.0 * self.expensive_chars / self.total_chars if self.total_chars else 0.0
+        return (
+            f"Cascade ({self.scanner}): {share:.1f}% of text reached {self.nlp.lang}_{self.nlp.meta.get('name', '')} "
+            f"({self.expensive_chars}/{self.total_chars} chars, "
+            f"{self.expensive_sentences}/{self.total_sentences} sentences)"
+        )
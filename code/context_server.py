@@ -0,0 +1,125 @@
+"""Serve the full context of windowed relation tasks on demand, next to the Prodigy server.
+
+Every request must carry the token the server was started with. The
+recipe only hands it to the browser in Prodigy's config, so whoever can
+fetch contexts could also open the annotation page. Protect the Prodigy
+server (e.g. with PRODIGY_BASIC_AUTH_USER/PASS) and the context port is
+covered by the same access control.
+"""
+
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from token_cache import task_key
+
+CONTEXT_PATH = "/context/"
+
+
+class ContextStore:
+    """SQLite store of full task contexts, written by the stream and read by the context server."""
+
+    def __init__(self, path=None):
+        """Open the store.
+
+        Args:
+            path: Location of the SQLite file. A temporary file that is
+                removed on close() is used if not given.
+        """
+        self.temporary = path is None
+        if path is None:
+            handle, path = tempfile.mkstemp(suffix=".contexts.sqlite")
+            os.close(handle)
+        self.path = str(path)
+        # The stream and the server's request threads share the connection
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS contexts (key TEXT PRIMARY KEY, context TEXT NOT NULL)")
+        self.lock = threading.Lock()
+
+    def put(self, text: str, context: Dict[str, Any]) -> str:
+        """Store the context of a task text.
+
+        Returns:
+            str: The key the context is served under.
+        """
+        key = task_key(text)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO contexts (key, context) VALUES (?, ?)",
+                (key, json.dumps(context, ensure_ascii=False)),
+            )
+            self.conn.commit()
+        return key
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the stored context as JSON, or None if there is none."""
+        with self.lock:
+            row = self.conn.execute("SELECT context FROM contexts WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        """Close the store, removing it if it is temporary."""
+        with self.lock:
+            self.conn.close()
+        if self.temporary and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def make_handler(store: ContextStore, token: str):
+    """Build a request handler answering GET /context/<key>?token=<token> from the store."""
+
+    class ContextHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            given = parse_qs(url.query).get("token", [""])[0]
+            if not hmac.compare_digest(given.encode("utf-8"), token.encode("utf-8")):
+                self.send_error(403)
+                return
+            context = None
+            if url.path.startswith(CONTEXT_PATH):
+                context = store.get(url.path[len(CONTEXT_PATH):])
+            body = (context or "{}").encode("utf-8")
+            self.send_response(200 if context is not None else 404)
+            # The annotation page is served by Prodigy on another port; only
+            # requests with the token, i.e. from that page, are answered
+            origin = self.headers.get("Origin")
+            if origin:
+                self.send_header("Access-Control-Allow-Origin", origin)
+                self.send_header("Vary", "Origin")
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ContextHandler
+
+
+def serve_contexts(store: ContextStore, host: str = "localhost", port: int = 0) -> ThreadingHTTPServer:
+    """Start serving the store's contexts in a background thread.
+
+    Args:
+        store (ContextStore): Where the contexts are read from.
+        host (str): Interface to listen on.
+        port (int): Port to listen on; 0 picks a free one.
+
+    Returns:
+        ThreadingHTTPServer: The running server. Its server_address holds
+        the port actually used and its ``token`` the token requests must
+        carry; call shutdown() to stop it.
+    """
+    token = secrets.token_urlsafe(24)
+    server = ThreadingHTTPServer((host, port), make_handler(store, token))
+    server.token = token
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
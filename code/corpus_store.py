@@ -0,0 +1,211 @@
+"""Indexed SQLite store of corpus records, for lookups and subsets without parsing the whole corpus.
+
+Build one from a tagged corpus or an annotation export:
+
+    python code/corpus_store.py data/processed/tagged/spaCy_Results.json
+
+The recipes and CombineNerAnnotations accept the resulting
+``.corpus.sqlite`` file wherever they accept a JSON(L) file.
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from json_stream import iter_json_records, iter_url_records
+
+CORPUS_SUFFIX = ".corpus.sqlite"
+
+# Rows are committed in batches of this size while a store is built
+COMMIT_EVERY = 1000
+
+
+def is_corpus_store(path) -> bool:
+    """Whether a path names a corpus store rather than a JSON(L) file."""
+    return str(path).endswith(CORPUS_SUFFIX)
+
+
+def default_store_path(corpus_path) -> Path:
+    """Return where a corpus file's store is written by default."""
+    corpus_path = Path(corpus_path)
+    return corpus_path.with_name(corpus_path.name + CORPUS_SUFFIX)
+
+
+def record_fields(record: Dict[str, Any], label: Optional[str] = None) -> Tuple[str, Dict[str, Any], Optional[str], Optional[int]]:
+    """Split a record into (url, body, label, input hash).
+
+    Handles ``{url: content}`` records from the tagging scripts, flat
+    entries with a ``url`` field and Prodigy examples, whose url is in
+    their meta and which carry an ``_input_hash``.
+    """
+    if "text" in record and "url" not in record:
+        url = (record.get("meta") or {}).get("url", "")
+        body = record
+    elif "url" in record or len(record) != 1:
+        url, body = record.get("url", ""), record
+    else:
+        url, body = next(iter(record.items()))
+    if isinstance(body, dict):
+        label = body.get("label", label)
+    return url, body, label, record.get("_input_hash")
+
+
+class CorpusStore:
+    """SQLite table of JSON records in input order, indexed by url, input hash and label.
+
+    Rows keep their input position as rowid, so position ranges and
+    label filters are index scans, and a record's JSON is only decoded
+    when it is read.
+    """
+
+    def __init__(self, path, readonly: bool = True):
+        """Open the store.
+
+        Args:
+            path: Location of the SQLite file.
+            readonly (bool): Open without write access, so several recipe
+                processes can read the same file safely.
+        """
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{Path(path)}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(str(path))
+            self.conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS records (
+                    position INTEGER PRIMARY KEY,
+                    url TEXT,
+                    input_hash INTEGER,
+                    label TEXT,
+                    body TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS records_url ON records (url);
+                CREATE INDEX IF NOT EXISTS records_input_hash ON records (input_hash);
+                CREATE INDEX IF NOT EXISTS records_label ON records (label, position);
+                """
+            )
+        self.pending = 0
+
+    def add(self, url: str, body: Any, label: Optional[str] = None, input_hash: Optional[int] = None) -> None:
+        """Append a record after the existing ones."""
+        self.conn.execute(
+            "INSERT INTO records (url, input_hash, label, body) VALUES (?, ?, ?, ?)",
+            (url, input_hash, label, json.dumps(body, ensure_ascii=False)),
+        )
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.conn.commit()
+            self.pending = 0
+
+    def _one(self, query: str, args: tuple) -> Optional[Any]:
+        row = self.conn.execute(query, args).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get(self, url: str) -> Optional[Any]:
+        """Return the record of a url (the latest one if it occurs twice), or None."""
+        return self._one("SELECT body FROM records WHERE url = ? ORDER BY position DESC LIMIT 1", (url,))
+
+    def get_by_hash(self, input_hash: int) -> Optional[Any]:
+        """Return the first record with this Prodigy input hash, or None."""
+        return self._one("SELECT body FROM records WHERE input_hash = ? ORDER BY position LIMIT 1", (input_hash,))
+
+    def count(self, label: Optional[str] = None) -> int:
+        """Number of records, optionally only those with a label."""
+        if label is None:
+            return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM records WHERE label = ?", (label,)).fetchone()[0]
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def labels(self) -> Dict[Optional[str], int]:
+        """Number of records per label."""
+        return dict(self.conn.execute("SELECT label, COUNT(*) FROM records GROUP BY label"))
+
+    def iter_rows(self, label: Optional[str] = None, start: int = 0,
+                  stop: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        """Yield (url, raw JSON) of the records in input positions [start, stop).
+
+        The JSON is not decoded, so counting or forwarding records is cheap.
+        """
+        query = "SELECT url, body FROM records WHERE position > ?"
+        args = [start]
+        if stop is not None:
+            query += " AND position <= ?"
+            args.append(stop)
+        if label is not None:
+            query += " AND label = ?"
+            args.append(label)
+        yield from self.conn.execute(query + " ORDER BY position", args)
+
+    def iter_records(self, label: Optional[str] = None, start: int = 0,
+                     stop: Optional[int] = None) -> Iterator[Tuple[str, Any]]:
+        """Yield (url, record), decoding one record at a time."""
+        for url, body in self.iter_rows(label, start, stop):
+            yield url, json.loads(body)
+
+    def close(self) -> None:
+        """Commit and close the store."""
+        self.conn.commit()
+        self.conn.close()
+
+
+def iter_corpus(path, label: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+    """Yield (url, content) from a corpus store or a JSON(L) corpus file."""
+    if is_corpus_store(path):
+        store = CorpusStore(path)
+        try:
+            yield from store.iter_records(label)
+        finally:
+            store.close()
+        return
+    for url, content in iter_url_records(path):
+        if label is None or content.get("label") == label:
+            yield url, content
+
+
+def build_store(paths: Iterable[str], output_path, label: Optional[str] = None) -> int:
+    """Append the records of corpus or export files to a store.
+
+    Args:
+        paths: JSON(L) files, read one record at a time.
+        output_path: The store to create or extend.
+        label (str): Label for records that do not carry one, e.g. for
+            the per-label output files of process_claims.py.
+
+    Returns:
+        int: Number of records added.
+    """
+    store = CorpusStore(output_path, readonly=False)
+    count = 0
+    try:
+        for path in paths:
+            for record in iter_json_records(path):
+                url, body, record_label, input_hash = record_fields(record, label)
+                store.add(url, body, record_label, input_hash)
+                count += 1
+    finally:
+        store.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an indexed corpus store from JSON or JSONL files.")
+    parser.add_argument("corpus", nargs="+", help="Tagged corpus or annotation export files")
+    parser.add_argument("--output", default=None, help="Store path (defaults to <first corpus>.corpus.sqlite)")
+    parser.add_argument("--label", default=None, help="Label for records that do not carry one")
+    args = parser.parse_args()
+
+    output_path = args.output or str(default_store_path(args.corpus[0]))
+    if not is_corpus_store(output_path):
+        parser.error(f"the store path must end with {CORPUS_SUFFIX}")
+    started = time.perf_counter()
+    count = build_store(args.corpus, output_path, args.label)
+    print(f"Stored {count} records in {time.perf_counter() - started:.1f}s -> {output_path}")
+
+
+if __name__ == "__main__":
+    main()
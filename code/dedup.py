@@ -0,0 +1,407 @@
+"""Cluster near-duplicate entries with MinHash/LSH so only one per cluster is tagged and annotated.
+
+Cluster the input entries and keep one representative of each cluster:
+
+    python code/dedup.py cluster data/claims.json --output data/claims.dedup.json --map data/claims.clusters.jsonl
+
+Run the tagging scripts and the recipes on the deduplicated file, then attach
+the results of each representative to the other members of its cluster:
+
+    python code/dedup.py propagate data/tagged.json --map data/claims.clusters.jsonl \
+        --entries data/claims.json --output data/tagged.full.json
+"""
+
+import argparse
+import re
+import time
+import zlib
+from bisect import bisect_right
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from corpus_store import record_fields
+from json_stream import iter_json_records, write_records
+from ner_tasks import build_ner_task
+from relation_tasks import section_bounds
+
+# Near-duplicates need this estimated Jaccard similarity of both their
+# claim and their document shingles, and the same label
+THRESHOLD = 0.8
+
+# Signature length, split into LSH bands of rows. With 16 bands of 4 rows,
+# pairs at the threshold become candidates with probability 0.9998, and
+# pairs below a similarity of about 0.5 rarely do
+NUM_PERM = 64
+BANDS = 16
+
+# Words per shingle; texts shorter than this are one shingle
+SHINGLE_WORDS = 3
+
+SEED = 1
+
+FIELDS = ("claim", "doc")
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+")
+# Words and single punctuation marks, aligned when re-anchoring entities
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> set:
+    """Word n-grams of the lower-cased text, ignoring punctuation and spacing."""
+    words = _WORD.findall((text or "").lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures from universal hashes of 32-bit shingle hashes.
+
+    Shingles are hashed with CRC-32, which unlike hash() is the same in
+    every process and run, so the clusters of an input are reproducible.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = SEED):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: set) -> np.ndarray:
+        """Minimum of every permutation over the shingles; an empty set gets the maximum."""
+        if not shingle_set:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingle_set),
+                             dtype=np.uint64, count=len(shingle_set))
+        # Products wrap around modulo 2**64, which keeps them well mixed
+        permuted = ((hashes[:, None] * self.a + self.b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_hashes(signatures: np.ndarray, bands: int) -> np.ndarray:
+    """(entries, bands) 64-bit hash of each band of rows of the signatures."""
+    rows = signatures.shape[1] // bands
+    banded = signatures[:, :bands * rows].reshape(len(signatures), bands, rows).astype(np.uint64)
+    hashed = np.zeros(banded.shape[:2], dtype=np.uint64)
+    for row in range(rows):
+        hashed = hashed * np.uint64(0x100000001B3) ^ banded[:, :, row]
+    return hashed
+
+
+def candidate_pairs(hashes: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """(pairs, 2) entries sharing a band bucket and a group, paired with the bucket's first entry.
+
+    Each band is sorted once, so finding candidates costs O(n log n) per
+    band; pairing with the first entry of a bucket instead of with every
+    other entry keeps large buckets linear.
+    """
+    pairs = []
+    entries = np.arange(len(hashes))
+    for band in range(hashes.shape[1]):
+        order = np.lexsort((entries, hashes[:, band], groups))
+        keys = np.stack([groups[order], hashes[order, band]], axis=1)
+        starts = np.ones(len(order), dtype=bool)
+        starts[1:] = (keys[1:] != keys[:-1]).any(axis=1)
+        first = order[np.flatnonzero(starts)[np.cumsum(starts) - 1]]
+        members = first != order
+        pairs.append(np.stack([first[members], order[members]], axis=1))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def similarity(signatures: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+    """Estimated Jaccard similarity of each pair: the share of equal signature values."""
+    if len(pairs) == 0:
+        return np.empty(0)
+    return (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+
+
+def find_root(parent: List[int], node: int) -> int:
+    while parent[node] != node:
+        parent[node] = parent[parent[node]]
+        node = parent[node]
+    return node
+
+
+def cluster_entries(entries: Iterator[Dict[str, Any]], threshold: float = THRESHOLD,
+                    num_perm: int = NUM_PERM, bands: int = BANDS) -> Dict[str, Any]:
+    """Cluster entries whose claims and documents are both near-duplicates.
+
+    Every entry gets a MinHash signature of its claim and of its document,
+    and LSH on each field proposes candidate pairs among entries with the
+    same label. A pair is joined when the estimated similarity of both
+    fields reaches ``threshold``; clusters are the connected components,
+    and the earliest entry of a cluster represents it.
+
+    Returns:
+        dict: "urls", "representative" (input position of each entry's
+        representative) and per-field "similarity" of each entry to it.
+    """
+    hasher = MinHasher(num_perm)
+    urls, label_ids, labels = [], [], {}
+    signatures = {field: [] for field in FIELDS}
+    for entry in entries:
+        urls.append(entry.get("url", ""))
+        label_ids.append(labels.setdefault(entry.get("label"), len(labels)))
+        for field in FIELDS:
+            signatures[field].append(hasher.signature(shingles(entry.get(field, ""))))
+
+    count = len(urls)
+    groups = np.asarray(label_ids, dtype=np.uint64)
+    matrices = {field: np.stack(rows) if rows else np.empty((0, num_perm), dtype=np.uint32)
+                for field, rows in signatures.items()}
+    pairs = np.concatenate([candidate_pairs(band_hashes(matrix, bands), groups) for matrix in matrices.values()])
+    pairs = np.unique(pairs, axis=0) if len(pairs) else np.empty((0, 2), dtype=np.int64)
+    close = np.ones(len(pairs), dtype=bool)
+    for matrix in matrices.values():
+        close &= similarity(matrix, pairs) >= threshold
+
+    parent = list(range(count))
+    for a, b in pairs[close].tolist():
+        root_a, root_b = find_root(parent, a), find_root(parent, b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    representative = np.asarray([find_root(parent, node) for node in range(count)], dtype=np.int64)
+
+    own = np.stack([representative, np.arange(count)], axis=1)
+    return {
+        "urls": urls,
+        "representative": representative,
+        "similarity": {field: similarity(matrix, own) for field, matrix in matrices.items()},
+    }
+
+
+def iter_cluster_map(clusters: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """One cluster map row per entry that is not its cluster's representative."""
+    urls = clusters["urls"]
+    for index, rep in enumerate(clusters["representative"].tolist()):
+        if rep == index:
+            continue
+        row = {"url": urls[index], "index": index, "representative": urls[rep], "representative_index": rep}
+        for field, values in clusters["similarity"].items():
+            row[f"{field}_similarity"] = round(float(values[index]), 4)
+        yield row
+
+
+def deduplicate(input_path, output_path, map_path, threshold: float = THRESHOLD,
+                num_perm: int = NUM_PERM, bands: int = BANDS) -> Tuple[int, int]:
+    """Write the representatives of the input's clusters and the cluster map.
+
+    The input is read twice, once to cluster it and once to copy the
+    representatives, so only the signatures are held in memory.
+
+    Returns:
+        tuple: (entries, representatives).
+    """
+    clusters = cluster_entries(iter_json_records(input_path), threshold, num_perm, bands)
+    representative = clusters["representative"]
+    is_representative = representative == np.arange(len(representative))
+    write_records(map_path, iter_cluster_map(clusters))
+    kept = (entry for index, entry in enumerate(iter_json_records(input_path)) if is_representative[index])
+    write_records(output_path, kept)
+    return len(representative), int(is_representative.sum())
+
+
+def load_members(map_path) -> Dict[str, List[str]]:
+    """Urls of the other members of each representative, in input order."""
+    members: Dict[str, List[str]] = {}
+    for row in iter_json_records(map_path):
+        members.setdefault(row["representative"], []).append(row["url"])
+    return members
+
+
+def load_member_entries(entries_path, members: Dict[str, List[str]]) -> Dict[str, Dict[str, Any]]:
+    """The input entries of every cluster member that is not a representative, by url."""
+    wanted = {url for urls in members.values() for url in urls}
+    return {entry.get("url", ""): entry for entry in iter_json_records(entries_path) if entry.get("url", "") in wanted}
+
+
+def reanchor(entities: List[Dict[str, Any]], old: str, new: str) -> Tuple[List[Dict[str, Any]], int]:
+    """Move entities with ``start``/``end`` offsets from one text onto a near-duplicate of it.
+
+    The words and punctuation of both texts are aligned with difflib. An
+    entity moves with the tokens it starts and ends in, if both are in an
+    unchanged stretch and its text is the same at the new place; otherwise
+    it is lost.
+
+    Returns:
+        tuple: The moved entities and the number of lost ones.
+    """
+    if old == new:
+        return [dict(entity) for entity in entities], 0
+    old_tokens = [(m.start(), m.end()) for m in _TOKEN.finditer(old)]
+    new_tokens = [(m.start(), m.end()) for m in _TOKEN.finditer(new)]
+    matcher = SequenceMatcher(None, [old[a:b] for a, b in old_tokens], [new[a:b] for a, b in new_tokens],
+                              autojunk=False)
+    # Old token index -> new token index, for tokens in unchanged stretches
+    aligned = {}
+    for a, b, size in matcher.get_matching_blocks():
+        for offset in range(size):
+            aligned[a + offset] = b + offset
+    token_starts = [start for start, _ in old_tokens]
+
+    def move(position: int, token: int) -> Optional[int]:
+        if token < 0 or token not in aligned or position > old_tokens[token][1]:
+            return None
+        return new_tokens[aligned[token]][0] + position - old_tokens[token][0]
+
+    moved, lost = [], 0
+    for entity in entities:
+        start, end = entity["start"], entity["end"]
+        new_start = move(start, bisect_right(token_starts, start) - 1)
+        new_end = move(end, bisect_right(token_starts, end - 1) - 1)
+        if new_start is None or new_end is None or new[new_start:new_end] != old[start:end]:
+            lost += 1
+        else:
+            moved.append(dict(entity, start=new_start, end=new_end))
+    return moved, lost
+
+
+def member_body(body: Dict[str, Any], entry: Dict[str, Any], representative: str) -> Dict[str, Any]:
+    """A member's tagged record, from the representative's.
+
+    Claim and doc are the member's own. Entities are copied where the
+    member's text is the same and re-anchored where it differs.
+    ``needs_tagging`` lists the fields whose entities could not all be
+    re-anchored, or whose results cannot be moved at all, such as the
+    token tags of process_claims.py, which are then left out.
+    """
+    result = dict(body)
+    stale = []
+    if "ner_tags" in body:
+        # process_claims.py results describe the normalized claim token by token
+        from process_claims import normalize_claim
+
+        if normalize_claim(entry.get("claim", ""))[0] != body.get("claim"):
+            result = {"claim": entry.get("claim", "")}
+            stale.append("claim")
+    else:
+        for field in FIELDS:
+            key = f"{field}_entities"
+            if key in body:
+                result[key], lost = reanchor(body[key], body.get(field, ""), entry.get(field, ""))
+                if lost:
+                    stale.append(field)
+            if field in body:
+                result[field] = entry.get(field, "")
+    if "label" in body:
+        result["label"] = entry.get("label", "")
+    result["duplicate_of"] = representative
+    if stale:
+        result["needs_tagging"] = stale
+    return result
+
+
+def member_example(example: Dict[str, Any], entry: Dict[str, Any], representative: str) -> Dict[str, Any]:
+    """A member's Prodigy example, from the representative's.
+
+    A member with the same label, claim and doc shares the representative's
+    input, so the example is copied whole. Otherwise it becomes a new NER
+    task on the member's text with the representative's spans re-anchored
+    onto it, and no answer or hashes, marked ``needs_annotation`` in meta.
+    """
+    url = entry.get("url", "")
+    fields = {key: entry.get(key, "") for key in ("label", "claim", "doc")}
+    text = example["text"]
+    claim, document = section_bounds(example)
+    if build_ner_task(url, fields)["text"] == text:
+        return dict(example, meta=dict(example.get("meta") or {}, url=url, duplicate_of=representative))
+
+    sections = {"claim": claim or (0, 0), "doc": document}
+    for field, (start, end) in sections.items():
+        entities = [
+            dict(span, start=span["start"] - start, end=span["end"] - start)
+            for span in example.get("spans", [])
+            if start <= span["start"] and span["end"] <= end
+        ]
+        fields[f"{field}_entities"], _ = reanchor(entities, text[start:end], fields[field])
+    task = build_ner_task(url, fields)
+    task["meta"].update(duplicate_of=representative, needs_annotation=True)
+    return task
+
+
+def member_record(record: Dict[str, Any], entry: Dict[str, Any], representative: str) -> Dict[str, Any]:
+    """A member's record in the shape of the representative's.
+
+    The member keeps its own url, claim and doc and takes the
+    representative's results, as far as they apply to its text.
+    ``duplicate_of`` names the representative.
+    """
+    url = entry.get("url", "")
+    if "text" in record and "url" not in record:
+        return member_example(record, entry, representative)
+    if "url" in record or len(record) != 1:
+        return dict(member_body(record, entry, representative), url=url)
+    return {url: member_body(next(iter(record.values())), entry, representative)}
+
+
+def iter_propagated(records: Iterator[Dict[str, Any]], members: Dict[str, List[str]],
+                    entries: Dict[str, Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Yield every record, each representative's followed by the records of its members."""
+    for record in records:
+        yield record
+        url = record_fields(record)[0]
+        for member in members.get(url, ()):
+            yield member_record(record, entries.get(member, {"url": member}), url)
+
+
+def propagate(results_path, map_path, entries_path, output_path) -> int:
+    """Attach tagging or annotation results of representatives to their members.
+
+    Args:
+        results_path: Tagged records or an annotation export of the representatives.
+        map_path: The cluster map written by deduplicate.
+        entries_path: The input that was clustered, for the members' own text.
+        output_path: Where to write the records of all entries.
+
+    Returns:
+        int: Number of records written.
+    """
+    members = load_members(map_path)
+    entries = load_member_entries(entries_path, members)
+    return write_records(output_path, iter_propagated(iter_json_records(results_path), members, entries))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Near-duplicate clustering of claim/document entries.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cluster = commands.add_parser("cluster", help="Keep one entry per near-duplicate cluster")
+    cluster.add_argument("input", help="JSON array or JSONL file with entries")
+    cluster.add_argument("--output", required=True, help="Where to write the representatives")
+    cluster.add_argument("--map", required=True, help="Where to write the cluster map (JSONL)")
+    cluster.add_argument("--threshold", type=float, default=THRESHOLD,
+                         help="Estimated Jaccard similarity both the claim and the doc must reach")
+    cluster.add_argument("--num-perm", type=int, default=NUM_PERM)
+    cluster.add_argument("--bands", type=int, default=BANDS)
+
+    spread = commands.add_parser(
+        "propagate",
+        help="Attach representatives' results to their cluster members; members keep their own claim and doc, "
+             "and entities are re-anchored onto them",
+    )
+    spread.add_argument("results", help="Tagged records or an annotation export of the representatives")
+    spread.add_argument("--map", required=True, help="Cluster map written by the cluster command")
+    spread.add_argument("--entries", required=True, help="The entries file given to the cluster command")
+    spread.add_argument("--output", required=True, help="Where to write the results for all entries")
+
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    if args.command == "cluster":
+        if args.num_perm % args.bands:
+            parser.error("--num-perm must be a multiple of --bands")
+        entries, kept = deduplicate(args.input, args.output, args.map, args.threshold, args.num_perm, args.bands)
+        print(f"Kept {kept} of {entries} entries ({entries - kept} near-duplicates) "
+              f"in {time.perf_counter() - started:.1f}s -> {args.output}, map -> {args.map}")
+    else:
+        count = propagate(args.results, args.map, args.entries, args.output)
+        print(f"Wrote {count} records in {time.perf_counter() - started:.1f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""On-disk, content-addressed cache for spaCy tagging results."""
+
+import hashlib
+import json
+import sqlite3
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from spacy.language import Language
+
+DEFAULT_MAX_ENTRIES = 200_000
+COMMIT_EVERY = 500
+
+# Texts looked up at a time by run_cached before their misses are tagged
+CACHE_WINDOW = 1024
+
+
+def _create_schema(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS entries ("
+        "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used INTEGER NOT NULL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON entries (last_used)")
+
+
+def _evict(conn: sqlite3.Connection, max_entries: int) -> int:
+    (count,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+    excess = count - max_entries
+    if excess <= 0:
+        return 0
+    conn.execute(
+        "DELETE FROM entries WHERE key IN "
+        "(SELECT key FROM entries ORDER BY last_used LIMIT ?)",
+        (excess,),
+    )
+    return excess
+
+
+class EntityCache:
+    """Store extracted entities keyed by text, model name and model version.
+
+    Entries are kept in SQLite and evicted least-recently-used once the cache
+    holds more than ``max_entries`` results.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        nlp: Language,
+        namespace: str,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        readonly: bool = False,
+    ):
+        """Open (or create) the cache file.
+
+        Args:
+            path (str): Location of the SQLite cache file.
+            nlp (Language): Model whose results are cached; its name and
+                version are part of every key.
+            namespace (str): Kind of result stored, so different extractors
+                sharing one file never see each other's entries.
+            max_entries (int): Number of results kept before eviction.
+            readonly (bool): Only look results up, without writing to the
+                file, so several processes can read it at once. A missing
+                file is treated as an empty cache.
+        """
+        self.prefix = "\0".join(
+            (namespace, f"{nlp.lang}_{nlp.meta.get('name', '')}", nlp.meta.get("version", ""))
+        )
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._pending_writes = 0
+        self.readonly = readonly
+        if not readonly:
+            self.conn = sqlite3.connect(path)
+            _create_schema(self.conn)
+        elif Path(path).exists():
+            self.conn = sqlite3.connect(f"file:{Path(path)}?mode=ro", uri=True)
+        else:
+            self.conn = sqlite3.connect(":memory:")
+            _create_schema(self.conn)
+        row = self.conn.execute("SELECT MAX(last_used) FROM entries").fetchone()
+        self._clock = row[0] or 0
+
+    def key(self, text: str) -> str:
+        """Return the content hash used to store a text's result."""
+        return hashlib.sha256(f"{self.prefix}\0{text}".encode("utf-8")).hexdigest()
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def lookup(self, text: str) -> Optional[Any]:
+        """Return the cached result for a text, or None, without counting a hit or miss."""
+        key = self.key(text)
+        row = self.conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if not self.readonly:
+            self.conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (self._tick(), key))
+        return json.loads(row[0])
+
+    def get(self, text: str) -> Optional[Any]:
+        """Return the cached result for a text, or None on a miss."""
+        value = self.lookup(text)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, text: str, value: Any) -> None:
+        """Store the result for a text."""
+        if self.readonly:
+            raise ValueError("cannot store results in a read-only entity cache")
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, last_used) VALUES (?, ?, ?)",
+            (self.key(text), json.dumps(value, ensure_ascii=False), self._tick()),
+        )
+        self._pending_writes += 1
+        if self._pending_writes >= COMMIT_EVERY:
+            self.flush()
+
+    def evict(self) -> int:
+        """Drop the least recently used entries above max_entries."""
+        return _evict(self.conn, self.max_entries)
+
+    def flush(self) -> None:
+        """Apply eviction and commit pending writes."""
+        if self.readonly:
+            return
+        self.evict()
+        self.conn.commit()
+        self._pending_writes = 0
+
+    def close(self) -> None:
+        """Commit and close the cache file."""
+        self.flush()
+        self.conn.close()
+
+    def report(self) -> str:
+        """Return a one-line summary of cache hits and misses."""
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return f"Cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)"
+
+    def __enter__(self) -> "EntityCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ShardEntityCache(EntityCache):
+    """Entity cache of a pool worker: reads a shared cache, writes its own file.
+
+    Workers never write to the shared file, so they cannot lock each other
+    out; merge_caches adds their files to the shared cache after the pool
+    has finished.
+    """
+
+    def __init__(self, shared_path: str, shard_path: str, nlp: Language, namespace: str):
+        super().__init__(shard_path, nlp, namespace)
+        self.shared = EntityCache(shared_path, nlp, namespace, readonly=True)
+
+    def lookup(self, text: str) -> Optional[Any]:
+        value = super().lookup(text)
+        return self.shared.lookup(text) if value is None else value
+
+    def close(self) -> None:
+        super().close()
+        self.shared.close()
+
+
+def merge_caches(path: str, sources: Iterable, max_entries: int = DEFAULT_MAX_ENTRIES) -> int:
+    """Add the entries of other cache files, e.g. per-shard ones, to a cache file.
+
+    Merged entries count as used after every entry already in ``path``.
+    Missing source files are skipped.
+
+    Returns:
+        int: Number of entries merged.
+    """
+    conn = sqlite3.connect(path)
+    merged = 0
+    try:
+        _create_schema(conn)
+        for source in sources:
+            if not Path(source).exists():
+                continue
+            (clock,) = conn.execute("SELECT COALESCE(MAX(last_used), 0) FROM entries").fetchone()
+            conn.execute("ATTACH DATABASE ? AS source", (str(source),))
+            cursor = conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, last_used) "
+                "SELECT key, value, last_used + ? FROM source.entries",
+                (clock,),
+            )
+            merged += cursor.rowcount
+            conn.commit()
+            conn.execute("DETACH DATABASE source")
+        _evict(conn, max_entries)
+        conn.commit()
+    finally:
+        conn.close()
+    return merged
+
+
+def cache_window(batch_size: int, n_process: int = 1) -> int:
+    """Texts looked up per run_cached window for an ``nlp.pipe`` setup.
+
+    Each window with misses starts ``nlp.pipe`` again, which with several
+    processes means new workers, so the window holds at least a few full
+    batches per process.
+    """
+    return max(CACHE_WINDOW, batch_size * n_process * 8)
+
+
+def pipe_cached(
+    nlp: Language,
+    texts: Iterable[str],
+    extract: Callable[[Any], Any],
+    cache: Optional[EntityCache] = None,
+    batch_size: int = 64,
+    n_process: int = 1,
+) -> Iterator[Any]:
+    """Yield ``extract(doc)`` for every text, in input order.
+
+    Texts with a cached result never reach spaCy; the rest go through
+    ``nlp.pipe`` and their results are stored in the cache.
+
+    Args:
+        nlp (Language): The spaCy language model.
+        texts: Texts to tag, consumed lazily.
+        extract: Turns a processed Doc into a JSON-serialisable result.
+        cache (EntityCache, optional): Cache to consult; None tags all texts.
+        batch_size (int): Number of texts per nlp.pipe batch.
+        n_process (int): Number of processes used by nlp.pipe.
+    """
+
+    def run(uncached: Iterable[str]) -> Iterator[Any]:
+        for doc in nlp.pipe(uncached, batch_size=batch_size, n_process=n_process):
+            yield extract(doc)
+
+    return run_cached(texts, run, cache, cache_window(batch_size, n_process))
+
+
+def run_cached(
+    texts: Iterable[str],
+    run: Callable[[Iterable[str]], Iterator[Any]],
+    cache: Optional[EntityCache] = None,
+    window: int = CACHE_WINDOW,
+) -> Iterator[Any]:
+    """Yield one result per text, in input order, computing only cache misses.
+
+    Texts are handled in windows of ``window``: look up the whole window,
+    run its misses, then yield it. A hit never waits for a miss beyond its
+    window, and at most ``window`` texts are held at a time however warm
+    the cache is.
+
+    Args:
+        texts: Texts to tag, consumed lazily.
+        run: Takes an iterable of texts and yields one result per text, in
+            order (for example a wrapper around ``nlp.pipe``).
+        cache (EntityCache, optional): Cache to consult; None runs all texts.
+        window (int): Texts looked up before their misses are run.
+    """
+    if cache is None:
+        yield from run(texts)
+        return
+
+    texts = iter(texts)
+    while True:
+        chunk = list(islice(texts, window))
+        if not chunk:
+            return
+        results = [cache.get(text) for text in chunk]
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            for index, result in zip(missing, run([chunk[index] for index in missing])):
+                results[index] = result
+                cache.put(chunk[index], result)
+        yield from results
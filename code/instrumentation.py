@@ -0,0 +1,259 @@
+"""Per-stage wall/CPU timers, counters and peak RSS for the preprocessing scripts, recipes and merger.
+
+Stages nest: a stage entered while another one runs (for example the input
+reader pulled by the NER stage's generator) is charged to itself, and only
+the rest of the outer stage's time counts as the outer stage's self time.
+The scripts take ``--profile <report.json>`` to write the report, and
+``--profile-stage <stage>`` to also write a cProfile dump of that stage.
+"""
+
+import cProfile
+import json
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows has no getrusage
+    resource = None
+
+# Progress lines are printed every this many entries instead of after each one
+PROGRESS_EVERY = 1000
+
+# Stages that only wait for worker processes, whose own stages are merged
+# in; they are never reported as the hottest stage
+WAIT_STAGES = {"shard_pool"}
+
+# ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """Peak resident set size of this process (or its finished children) in MB."""
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    return round(resource.getrusage(who).ru_maxrss * _RSS_UNIT / 1e6, 1)
+
+
+class Metrics:
+    """Stage timings, counters and the RSS peak reached by the end of each stage."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        # name -> [calls, wall, cpu, self wall, self cpu, peak rss]
+        self.stages: Dict[str, list] = {}
+        self.counters = Counter()
+        # [name, child wall, child cpu] of every stage that is running
+        self.stack: list = []
+        self.profile_stage: Optional[str] = None
+        self.profiler: Optional[cProfile.Profile] = None
+        self.profiling = False
+
+    def profile(self, stage: Optional[str]) -> None:
+        """Run cProfile whenever ``stage`` runs, including the stages nested in it."""
+        self.profile_stage = stage
+        self.profiler = cProfile.Profile() if stage else None
+
+    def _enter(self, name: str):
+        profiling = name == self.profile_stage and not self.profiling
+        if profiling:
+            self.profiling = True
+            self.profiler.enable()
+        self.stack.append([name, 0.0, 0.0])
+        return time.perf_counter(), time.process_time(), profiling
+
+    def _exit(self, name: str, wall_started: float, cpu_started: float, profiling: bool) -> None:
+        wall = time.perf_counter() - wall_started
+        cpu = time.process_time() - cpu_started
+        if profiling:
+            self.profiler.disable()
+            self.profiling = False
+        _, child_wall, child_cpu = self.stack.pop()
+        if self.stack:
+            self.stack[-1][1] += wall
+            self.stack[-1][2] += cpu
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = [0, 0.0, 0.0, 0.0, 0.0, None]
+        stats[0] += 1
+        stats[1] += wall
+        stats[2] += cpu
+        stats[3] += wall - child_wall
+        stats[4] += cpu - child_cpu
+        stats[5] = peak_rss_mb()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the body of a with block as one call of the stage."""
+        started = self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit(name, *started)
+
+    def timed(self, name: str, iterable: Iterable) -> Iterator:
+        """Yield from an iterable, timing each step as one call of the stage.
+
+        Lazy pipelines do their work when the next item is requested, so
+        this charges a generator's work to its stage wherever it is consumed.
+        """
+        iterator = iter(iterable)
+        while True:
+            started = self._enter(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit(name, *started)
+            yield item
+
+    def count(self, name: str, n: int = 1) -> int:
+        """Add to a counter and return its new value."""
+        self.counters[name] += n
+        return self.counters[name]
+
+    def merge(self, report: Dict[str, Any]) -> None:
+        """Add the stages and counters of another process's report, e.g. a shard worker's."""
+        for name, other in report.get("stages", {}).items():
+            stats = self.stages.setdefault(name, [0, 0.0, 0.0, 0.0, 0.0, None])
+            stats[0] += other["calls"]
+            stats[1] += other["wall_seconds"]
+            stats[2] += other["cpu_seconds"]
+            stats[3] += other["self_wall_seconds"]
+            stats[4] += other["self_cpu_seconds"]
+            if other.get("peak_rss_mb") is not None:
+                stats[5] = max(stats[5] or 0, other["peak_rss_mb"])
+        self.counters.update(report.get("counters", {}))
+
+    def hottest_stage(self) -> Optional[str]:
+        """The stage with the most self wall time."""
+        candidates = [name for name in self.stages if name not in WAIT_STAGES]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda name: self.stages[name][3])
+
+    def report(self) -> Dict[str, Any]:
+        wall = time.perf_counter() - self.started
+        stages = {}
+        for name, (calls, stage_wall, cpu, self_wall, self_cpu, rss) in self.stages.items():
+            stages[name] = {
+                "calls": calls,
+                "wall_seconds": round(stage_wall, 4),
+                "cpu_seconds": round(cpu, 4),
+                "self_wall_seconds": round(self_wall, 4),
+                "self_cpu_seconds": round(self_cpu, 4),
+                "share_of_wall": round(self_wall / wall, 4) if wall > 0 else None,
+                "peak_rss_mb": rss,
+            }
+        return {
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(time.process_time() - self.cpu_started, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "children_peak_rss_mb": peak_rss_mb(children=True),
+            "stages": stages,
+            "hottest_stage": self.hottest_stage(),
+            "counters": dict(self.counters),
+            "rates_per_second": {name: round(value / wall, 2) for name, value in self.counters.items()} if wall > 0 else {},
+        }
+
+
+METRICS = Metrics()
+
+
+def reset() -> Metrics:
+    """Start a fresh set of metrics, e.g. in a pool worker for each shard."""
+    global METRICS
+    METRICS = Metrics()
+    return METRICS
+
+
+def stage(name: str):
+    return METRICS.stage(name)
+
+
+def timed(name: str, iterable: Iterable) -> Iterator:
+    return METRICS.timed(name, iterable)
+
+
+def count(name: str, n: int = 1) -> int:
+    return METRICS.count(name, n)
+
+
+def progress(name: str, every: int = PROGRESS_EVERY) -> int:
+    """Count one more item and print a progress line every ``every`` items."""
+    value = METRICS.count(name)
+    if value % every == 0:
+        print(f"{value} {name}")
+    return value
+
+
+def count_tasks(stream: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Pass tasks through, counting them and their tokens, spans and relations."""
+    for task in stream:
+        METRICS.count("tasks")
+        for key in ("tokens", "spans", "relations"):
+            METRICS.count(key, len(task.get(key) or ()))
+        yield task
+
+
+def profile_path(report_path) -> str:
+    """Where the cProfile dump of a report is written."""
+    return f"{report_path}.prof"
+
+
+def write_report(path, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Write the metrics report as JSON, and the cProfile dump if a stage was profiled.
+
+    Returns:
+        dict: The report.
+    """
+    report = dict(METRICS.report(), **(extra or {}))
+    if METRICS.profiler is not None:
+        report["profiled_stage"] = METRICS.profile_stage
+        report["profile_dump"] = profile_path(path)
+        METRICS.profiler.dump_stats(profile_path(path))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return report
+
+
+def summary(report: Dict[str, Any]) -> str:
+    """One console line per stage, hottest first."""
+    lines = [f"Wall {report['wall_seconds']:.1f}s, CPU {report['cpu_seconds']:.1f}s, peak RSS {report['peak_rss_mb']} MB"]
+    by_self = sorted(report["stages"].items(), key=lambda item: -item[1]["self_wall_seconds"])
+    for name, stats in by_self:
+        lines.append(f"  {name}: {stats['self_wall_seconds']:.2f}s self, {stats['wall_seconds']:.2f}s total, "
+                     f"{stats['calls']} calls")
+    if report.get("hottest_stage") and "profile_dump" not in report:
+        lines.append(f"Rerun with --profile-stage {report['hottest_stage']} for a cProfile dump of the hottest stage")
+    return "\n".join(lines)
+
+
+def add_profile_arguments(parser) -> None:
+    """Add --profile and --profile-stage to an argparse parser."""
+    parser.add_argument("--profile", default=None,
+                        help="Write a JSON report of per-stage wall/CPU time, counters and peak RSS here")
+    parser.add_argument("--profile-stage", default=None,
+                        help="Also write a cProfile dump of this stage to <profile>.prof")
+
+
+def start_profile(report_path, profile_stage: Optional[str] = None) -> None:
+    """Begin a profiled run: fresh metrics, and cProfile for ``profile_stage`` if given."""
+    reset()
+    if report_path and profile_stage:
+        METRICS.profile(profile_stage)
+
+
+def finish_profile(report_path, extra: Optional[Dict[str, Any]] = None) -> None:
+    """Write and summarize the report if ``report_path`` is set."""
+    if not report_path:
+        return
+    report = write_report(report_path, extra)
+    print(summary(report))
+    print(f"Profile report -> {report_path}")
@@ -0,0 +1,175 @@
+"""Incremental reading and writing of JSON array, JSON object and JSONL files."""
+
+import json
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Tuple
+
+CHUNK_SIZE = 1 << 16
+JSONL_SUFFIXES = {".jsonl", ".ndjson"}
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class _IncrementalReader:
+    """Decode JSON values from a file without reading all of it at once."""
+
+    def __init__(self, file):
+        self.file = file
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """Read the next chunk into the buffer, return False at end of file."""
+        if self.eof:
+            return False
+        chunk = self.file.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has already been consumed so the buffer stays small
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character, or "" at end of file."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        """Consume a structural character such as "," or ":"."""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in JSON stream, found {found!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode and consume the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_array(reader: _IncrementalReader) -> Iterator[Any]:
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        if reader.peek() == "]":
+            reader.pos += 1
+            return
+        reader.expect(",")
+
+
+def _iter_object(reader: _IncrementalReader) -> Iterator[Any]:
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.pos += 1
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        yield {key: reader.value()}
+        if reader.peek() == "}":
+            reader.pos += 1
+            return
+        reader.expect(",")
+
+
+def iter_json_records(path) -> Iterator[Any]:
+    """Yield the top-level records of a JSON or JSONL file one at a time.
+
+    A JSON array yields its elements, a JSON object yields each key/value
+    pair as a one-key dict, and a ``.jsonl``/``.ndjson`` file yields one
+    record per non-empty line.
+
+    Args:
+        path: Path to the input file.
+
+    Yields:
+        The decoded records, in file order.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        if Path(path).suffix.lower() in JSONL_SUFFIXES:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        reader = _IncrementalReader(file)
+        first = reader.peek()
+        if first == "[":
+            yield from _iter_array(reader)
+        elif first == "{":
+            yield from _iter_object(reader)
+        # Anything after the top-level value is read as concatenated records
+        while reader.peek():
+            yield reader.value()
+
+
+def iter_url_records(path) -> Iterator[Tuple[str, dict]]:
+    """Yield (url, content) pairs from a tagged corpus file.
+
+    Handles the ``{url: content}`` records written by the tagging scripts
+    (as a JSON object, a JSON array or JSONL) as well as flat entries that
+    carry their own ``url`` field.
+    """
+    for record in iter_json_records(path):
+        if "url" in record or len(record) != 1:
+            yield record.get("url", ""), record
+        else:
+            yield next(iter(record.items()))
+
+
+def write_jsonl(path, records: Iterable[Any]) -> int:
+    """Write records to a JSONL file as they arrive and return their count."""
+    count = 0
+    with open(path, "w", encoding="utf-8") as outfile:
+        for record in records:
+            outfile.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def write_json_array(path, records: Iterable[Any], indent: int = 4) -> int:
+    """Write records as a JSON array one element at a time and return their count.
+
+    The result is what json.dump writes for the same list, without holding
+    the list in memory.
+    """
+    count = 0
+    pad = " " * indent
+    with open(path, "w", encoding="utf-8") as outfile:
+        outfile.write("[")
+        for record in records:
+            element = json.dumps(record, ensure_ascii=False, indent=indent).replace("\n", "\n" + pad)
+            outfile.write(("," if count else "") + "\n" + pad + element)
+            count += 1
+        outfile.write("\n]" if count else "]")
+    return count
+
+
+def write_records(path, records: Iterable[Any]) -> int:
+    """Write JSONL for .jsonl/.ndjson paths and a JSON array otherwise."""
+    if Path(path).suffix.lower() in JSONL_SUFFIXES:
+        return write_jsonl(path, records)
+    return write_json_array(path, records)
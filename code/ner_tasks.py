@@ -0,0 +1,86 @@
+"""Build NER annotation tasks from tagged corpus records."""
+
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+# Define numerical labels
+NUMERICAL_LABELS = ["CARDINAL", "MONEY", "PERCENT", "QUANTITY", "TIME", "DATE", "ORDINAL"]
+
+LABEL_PREFIX = "Label: "
+CLAIM_PREFIX = "\n\nClaim: "
+DOC_PREFIX = "\n\nDocument: "
+FEEDBACK_INSTRUCTIONS = "\n\nInstructions: Any additional issues or information required please input that in the box bellow"
+
+
+def build_ner_task(url: str, content: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn one tagged record into an NER annotation task (without tokens).
+
+    Args:
+        url (str): The record's URL, kept in the task meta.
+        content (dict): The record with claim, doc, their entities and label.
+
+    Returns:
+        dict: Task with the combined text, all spans shifted onto it, the
+        numerical spans and the claim/doc offsets in meta.
+    """
+    # Defining the data and the prefixes
+    claim = content['claim']
+    claim_entities = content.get('claim_entities', [])
+    doc = content['doc']
+    doc_entities = content.get('doc_entities', [])
+
+    label = content.get('label', '')
+
+    # Is essentially the order of the content in the stream
+    combined_text = f"{LABEL_PREFIX}{label}{CLAIM_PREFIX}{claim}{DOC_PREFIX}{doc}{FEEDBACK_INSTRUCTIONS}"
+
+    # Important, as it keeps track of what extra has been added so that spans are correct
+    claim_offset = len(CLAIM_PREFIX) + len(LABEL_PREFIX) + len(label)
+
+    adjusted_claim_entities = [
+        {
+            "start": entity["start"] + claim_offset,
+            "end": entity["end"] + claim_offset,
+            "label": entity["label"],
+            "text": claim[entity["start"]:entity["end"]]
+        }
+        for entity in claim_entities
+    ]
+
+    # Caluclating the same but for everything that comes before the document
+    doc_offset = len(f"{LABEL_PREFIX}{label}{CLAIM_PREFIX}{claim}{DOC_PREFIX}")
+    adjusted_doc_entities = [
+        {
+            "start": entity["start"] + doc_offset,
+            "end": entity["end"] + doc_offset,
+            "label": entity["label"],
+            "text": doc[entity["start"]:entity["end"]]
+        }
+        for entity in doc_entities
+    ]
+
+    # Build the complete list of spans (first claim then document entities)
+    spans = adjusted_claim_entities + adjusted_doc_entities
+
+    # Filter numerical spans
+    numerical_spans = [span for span in spans if span["label"] in NUMERICAL_LABELS]
+
+    # Creates the annotation task; the section offsets let the relation recipe
+    # highlight the claim without searching the text for it
+    return {
+        "text": combined_text,
+        "meta": {
+            "url": url,
+            "claim_start": claim_offset,
+            "claim_end": claim_offset + len(claim),
+            "doc_start": doc_offset,
+            "doc_end": doc_offset + len(doc),
+        },
+        "spans": spans,
+        "numerical_spans": numerical_spans  # Store filtered numerical spans
+    }
+
+
+def iter_ner_tasks(records: Iterable[Tuple[str, Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+    """Lazily build one task per (url, content) record."""
+    for url, content in records:
+        yield build_ner_task(url, content)
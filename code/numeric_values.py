@@ -0,0 +1,205 @@
+"""Shared parsing of numeric phrases such as "one million" or "$2 billion"."""
+
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from word2number import w2n
+
+# Number of distinct phrases whose parse is kept in memory
+PARSE_CACHE_SIZE = 8192
+
+NUMBER_WORDS = frozenset(
+    """
+    zero one two three four five six seven eight nine ten eleven twelve
+    thirteen fourteen fifteen sixteen seventeen eighteen nineteen twenty
+    thirty forty fifty sixty seventy eighty ninety hundred thousand
+    million billion trillion point half quarter
+    """.split()
+)
+
+MULTIPLIERS = {
+    "thousand": 1000,
+    "million": 1000000,
+    "billion": 1000000000,
+    "trillion": 1000000000000,
+}
+
+CURRENCY_SYMBOLS = {"$": "USD", "£": "GBP", "€": "EUR", "¥": "JPY"}
+
+CURRENCY_WORDS = {
+    "dollar": "USD",
+    "dollars": "USD",
+    "usd": "USD",
+    "pound": "GBP",
+    "pounds": "GBP",
+    "gbp": "GBP",
+    "euro": "EUR",
+    "euros": "EUR",
+    "eur": "EUR",
+    "yen": "JPY",
+}
+
+PERCENT_WORDS = {"%", "percent", "percentage"}
+
+
+class NumericValue(NamedTuple):
+    """Structured form of a numeric phrase.
+
+    Attributes:
+        magnitude: The numeric value with multipliers applied, or None if no
+            number could be read.
+        currency: ISO currency code, or None.
+        unit: Remaining non-number words (e.g. "people"), or None.
+        is_percent: Whether the phrase is a percentage.
+        display: The formatted string convert_phrase has always returned,
+            or None when it could not convert the phrase.
+    """
+
+    magnitude: Optional[float]
+    currency: Optional[str]
+    unit: Optional[str]
+    is_percent: bool
+    display: Optional[str]
+
+
+def get_multipliers() -> Dict[str, int]:
+    """Return a dictionary of multiplier words and their values."""
+    return dict(MULTIPLIERS)
+
+
+def word_to_num(phrase: str):
+    """``w2n.word_to_num``, raising ValueError for every phrase it cannot read.
+
+    word2number raises IndexError instead on some phrases, e.g.
+    "thousand five seven" or "million thousand".
+    """
+    try:
+        return w2n.word_to_num(phrase)
+    except IndexError as error:
+        raise ValueError(f"Cannot read a number in {phrase!r}") from error
+
+
+def handle_currency_and_multiplier(words: List[str]) -> tuple:
+    """Process currency symbols and multipliers in number words."""
+    has_dollar = False
+    if not words:
+        return None, False
+    if words[0].startswith("$"):
+        words[0] = words[0][1:]
+        has_dollar = True
+
+    if len(words) == 2 and words[1] in MULTIPLIERS:
+        try:
+            base_num = float(words[0].replace(",", ""))
+        except ValueError:
+            try:
+                base_num = word_to_num(words[0])
+            except ValueError:
+                return None, has_dollar
+
+        final_num = base_num * MULTIPLIERS[words[1]]
+        formatted = "{:,.0f}".format(final_num)
+        return f"${formatted}" if has_dollar else formatted, has_dollar
+
+    return None, False
+
+
+def _display(phrase: str) -> Optional[str]:
+    """Format a phrase exactly as the original convert_phrase did."""
+    try:
+        words = phrase.lower().split()
+        result, has_dollar = handle_currency_and_multiplier(words)
+
+        if result:
+            return result
+
+        # Regular conversion for other cases
+        num = word_to_num(phrase)
+        formatted = "{:,}".format(num)
+        return f"${formatted}" if has_dollar else formatted
+    except ValueError:
+        return None
+
+
+def _to_float(word: str) -> Optional[float]:
+    try:
+        return float(word.replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _magnitude(words: List[str]) -> Tuple[Optional[float], List[str], bool, Optional[str]]:
+    """Read the number, unit words, percent flag and currency word of a phrase."""
+    base = None
+    multiplier = 1
+    number_words = []
+    unit_words = []
+    is_percent = False
+    currency = None
+
+    for word in words:
+        cleaned = word.strip(".,()")
+        value = _to_float(cleaned)
+        if value is not None and base is None and not number_words:
+            base = value
+        elif cleaned in MULTIPLIERS and base is not None:
+            multiplier *= MULTIPLIERS[cleaned]
+        elif cleaned.replace("-", "") in NUMBER_WORDS or (
+            "-" in cleaned and all(part in NUMBER_WORDS for part in cleaned.split("-"))
+        ):
+            number_words.append(cleaned)
+        elif cleaned in PERCENT_WORDS:
+            is_percent = True
+        elif cleaned in CURRENCY_WORDS:
+            currency = CURRENCY_WORDS[cleaned]
+        elif cleaned:
+            unit_words.append(cleaned)
+
+    if base is None and number_words:
+        try:
+            base = float(word_to_num(" ".join(number_words)))
+        except ValueError:
+            base = None
+    magnitude = base * multiplier if base is not None else None
+    return magnitude, unit_words, is_percent, currency
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_numeric(phrase: str) -> NumericValue:
+    """Parse a numeric phrase into a NumericValue.
+
+    Results are memoized in a bounded LRU cache, so repeated phrases such as
+    "one million" are only parsed once per process.
+
+    Args:
+        phrase (str): A phrase such as "$2 billion", "50 percent" or
+            "one hundred twenty three".
+
+    Returns:
+        NumericValue: The structured value. ``display`` matches what
+        convert_phrase returns for the phrase.
+
+    Example:
+        >>> parse_numeric("$2 billion").magnitude
+        2000000000.0
+    """
+    text = phrase.lower().replace("%", " % ").replace("per cent", "percent")
+    currency = None
+    for symbol, code in CURRENCY_SYMBOLS.items():
+        if symbol in text:
+            currency = code
+            text = text.replace(symbol, " ")
+
+    magnitude, unit_words, is_percent, currency_word = _magnitude(text.split())
+    return NumericValue(
+        magnitude=magnitude,
+        currency=currency or currency_word,
+        unit=" ".join(unit_words) or None,
+        is_percent=is_percent,
+        display=_display(phrase),
+    )
+
+
+def convert_phrase(phrase: str) -> Optional[str]:
+    """Convert a phrase of words to a formatted number with commas."""
+    return parse_numeric(phrase).display
@@ -0,0 +1,65 @@
+"""Map character offsets in normalized text back to the original text."""
+
+from bisect import bisect_right
+from typing import Any, Dict, List, Tuple
+
+
+class OffsetMap:
+    """Segment-wise mapping from a normalized string to its source string.
+
+    Every segment is a piece of the normalized text together with the range
+    of the original text it came from. Verbatim segments map character by
+    character; rewritten segments (e.g. "one million" -> "1,000,000") map
+    as a whole.
+    """
+
+    def __init__(self):
+        self.norm_starts: List[int] = []
+        self.norm_ends: List[int] = []
+        self.orig_starts: List[int] = []
+        self.orig_ends: List[int] = []
+        self.verbatim: List[bool] = []
+
+    def add(self, norm_start: int, norm_end: int, orig_start: int, orig_end: int, verbatim: bool) -> None:
+        """Append a segment; segments must be added in text order."""
+        self.norm_starts.append(norm_start)
+        self.norm_ends.append(norm_end)
+        self.orig_starts.append(orig_start)
+        self.orig_ends.append(orig_end)
+        self.verbatim.append(verbatim)
+
+    def _segment(self, position: int) -> int:
+        """Index of the segment holding position, or of the next one after a gap."""
+        index = bisect_right(self.norm_starts, position) - 1
+        if index < 0:
+            return 0
+        if position >= self.norm_ends[index] and index + 1 < len(self.norm_starts):
+            return index + 1
+        return index
+
+    def to_original(self, start: int, end: int) -> Tuple[int, int]:
+        """Project a normalized [start, end) range onto the original text."""
+        if not self.norm_starts:
+            return start, end
+
+        first = self._segment(start)
+        if self.verbatim[first] and start >= self.norm_starts[first]:
+            orig_start = self.orig_starts[first] + (start - self.norm_starts[first])
+        else:
+            orig_start = self.orig_starts[first]
+
+        last = max(bisect_right(self.norm_starts, end - 1) - 1, first)
+        if self.verbatim[last] and end <= self.norm_ends[last]:
+            orig_end = self.orig_starts[last] + (end - self.norm_starts[last])
+        else:
+            orig_end = self.orig_ends[last]
+        return orig_start, orig_end
+
+
+def project_entities(entities: List[Dict[str, Any]], offset_map: OffsetMap, original: str) -> List[Dict[str, Any]]:
+    """Return copies of entities with start_char/end_char on the original text."""
+    projected = []
+    for entity in entities:
+        start, end = offset_map.to_original(entity["start_char"], entity["end_char"])
+        projected.append({**entity, "text": original[start:end], "start_char": start, "end_char": end})
+    return projected
@@ -0,0 +1,61 @@
+"""Tokenize the annotation tasks of a tagged corpus once, ahead of serving.
+
+The recipes look tokens up by the hash of the task text and only tokenize
+tasks that are missing from the store.
+"""
+
+import argparse
+import time
+
+import spacy
+
+from corpus_store import iter_corpus
+from ner_tasks import iter_ner_tasks
+from token_cache import TokenCache, default_token_cache_path, task_key, tokens_from_doc
+
+
+def pretokenize(corpus_path: str, output_path: str, batch_size: int = 256) -> int:
+    """Write the tokens of every NER task of a corpus to a token store.
+
+    Args:
+        corpus_path (str): Tagged corpus (JSON, JSONL or corpus store) read by the recipes.
+        output_path (str): SQLite token store to create or update.
+        batch_size (int): Number of texts tokenized per batch.
+
+    Returns:
+        int: Number of distinct task texts tokenized.
+    """
+    nlp = spacy.blank("en")
+    cache = TokenCache(output_path, readonly=False)
+    seen = set()
+
+    def new_texts():
+        for task in iter_ner_tasks(iter_corpus(corpus_path)):
+            key = task_key(task["text"])
+            if key not in seen:
+                seen.add(key)
+                yield task["text"]
+
+    count = 0
+    for doc in nlp.tokenizer.pipe(new_texts(), batch_size=batch_size):
+        cache.put(doc.text, tokens_from_doc(doc))
+        count += 1
+    cache.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-tokenize the NER tasks of a tagged corpus.")
+    parser.add_argument("corpus", help="Tagged corpus, e.g. data/processed/tagged/spaCy_Results.json")
+    parser.add_argument("--output", default=None,
+                        help="Token store path (defaults to <corpus>.tokens.sqlite, where the recipes look)")
+    args = parser.parse_args()
+
+    output_path = args.output or str(default_token_cache_path(args.corpus))
+    started = time.perf_counter()
+    count = pretokenize(args.corpus, output_path)
+    print(f"Tokenized {count} tasks in {time.perf_counter() - started:.1f}s -> {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,70 +3,94 @@
 
 """Module to load, process, and save tagged claims data."""
 
+import time
+
+_import_started = time.perf_counter()
+
+import argparse
 import spacy
 import json
-from word2number import w2n
+import re
+from collections import deque
 from spacy.cli import download
 from spacy.language import Language
-from typing import Set, Any, Dict, List, Optional, Tuple
+from typing import Set, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from json_stream import iter_json_records
+from entity_cache import EntityCache, ShardEntityCache, cache_window, merge_caches, pipe_cached, run_cached
+from spacy_models import cold_start_report, get_model
+from spacy_models import is_model_available as _is_package_installed
+from cascade_ner import CascadeNER
+from offset_map import OffsetMap, project_entities
+from sharding import (
+    iter_shard_input,
+    remove_shards,
+    run_sharded,
+    shard_cache_path,
+    shard_cache_paths,
+    write_shard_output,
+)
+from instrumentation import add_profile_arguments, count, finish_profile, progress, stage, start_profile, timed
+from numeric_values import MULTIPLIERS, NUMBER_WORDS, convert_phrase
+
+# Labels tagged by default, each written to its own output file
+DEFAULT_LABELS = ("False", "True", "Half True/False")
+
+# Kind of result stored in the entity cache by this module
+CACHE_NAMESPACE = "claim_tags"
+
+# Claims are only read as tokens and doc.ents, so the components that do not
+# contribute to the entities are not loaded
+ENTITY_ONLY = True
 
 
 def load_json_data(path: str) -> List[Dict[str, Any]]:
     """Load JSON data from a file and return it as a list of dictionaries."""
-    with open(path, "r") as file:
+    with stage("read"), open(path, "r") as file:
         data = json.load(file)
     return data
 
 
-def url_true_claim_statistical(data: list, cond: bool) -> dict:
-    """Extract claims.
+# Longest number phrase process_claim tries to convert, in words
+MAX_PHRASE_WORDS = 4
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def partition_by_label(
+    data: Iterable[Dict[str, Any]], labels: Optional[Iterable[str]] = None
+) -> Dict[str, Dict[str, str]]:
+    """Split entries into URL-to-claim buckets, one per label, in one pass.
+
+    Args:
+        data: The input entries.
+        labels: Labels to keep; None keeps every label that occurs.
 
-    Need to be statistical with label True and return a dictionary of URL (used
-    as ID) and the claim.
+    Returns:
+        dict: label -> {url: claim}, each bucket in input order.
     """
-    url_and_claim = {}
+    wanted = None if labels is None else set(labels)
+    buckets = {} if wanted is None else {label: {} for label in labels}
     for item in data:
-        if cond is True and (
-            item.get("label") == "True"
-        ):
-            url_and_claim[item.get("url")] = item.get("claim")
-        elif cond is False and (
-            item.get("label") == "False"
-        ):
-            url_and_claim[item.get("url")] = item.get("claim")
-        elif cond == "Half True/False" and (
-            item.get("label") == "Half True/False"
-        ):
-            url_and_claim[item.get("url")] = item.get("claim")
-    return url_and_claim
+        label = item.get("label")
+        if wanted is None or label in wanted:
+            buckets.setdefault(label, {})[item.get("url")] = item.get("claim")
+    return buckets
 
 
-def get_number_words_set() -> set:
-    """Return a set of valid number words."""
-    return set(
-        """
-        zero one two three four five six seven eight nine ten eleven twelve
-        thirteen fourteen fifteen sixteen seventeen eighteen nineteen twenty
-        thirty forty fifty sixty seventy eighty ninety hundred thousand
-        million billion trillion point half quarter
-    """.split()
-    )
+def label_slug(label: str) -> str:
+    """Turn a label such as "Half True/False" into a file name part."""
+    return re.sub(r"[^0-9a-z]+", "_", str(label).lower()).strip("_")
 
 
-def get_multipliers() -> Dict[str, int]:
-    """Return a dictionary of multiplier words and their values."""
-    return {
-        "thousand": 1000,
-        "million": 1000000,
-        "billion": 1000000000,
-        "trillion": 1000000000000,
-    }
+def get_number_words_set() -> set:
+    """Return a set of valid number words."""
+    return set(NUMBER_WORDS)
 
 
 def is_number_word(word: str) -> bool:
     """Check if a word is a valid number word."""
     word = word.lower().replace("-", "").strip(".,")
-    if word in get_number_words_set():
+    if word in NUMBER_WORDS:
         return True
     try:
         float(word.replace(",", ""))
@@ -75,44 +99,15 @@ def is_number_word(word: str) -> bool:
         return False
 
 
-def handle_currency_and_multiplier(words: List[str]) -> tuple:
-    """Process currency symbols and multipliers in number words."""
-    has_dollar = False
-    if words[0].startswith("$"):
-        words[0] = words[0][1:]
-        has_dollar = True
-
-    if len(words) == 2 and words[1] in get_multipliers():
-        try:
-            base_num = float(words[0].replace(",", ""))
-        except ValueError:
-            try:
-                base_num = w2n.word_to_num(words[0])
-            except ValueError:
-                return None, has_dollar
-
-        final_num = base_num * get_multipliers()[words[1]]
-        formatted = "{:,.0f}".format(final_num)
-        return f"${formatted}" if has_dollar else formatted, has_dollar
+def has_numeric_candidate(sentence: str) -> bool:
+    """Check if a sentence may contain a numeric entity.
 
-    return None, False
-
-
-def convert_phrase(phrase: str) -> Optional[str]:
-    """Convert a phrase of words to a formatted number with commas."""
-    try:
-        words = phrase.lower().split()
-        result, has_dollar = handle_currency_and_multiplier(words)
-
-        if result:
-            return result
-
-        # Regular conversion for other cases
-        num = w2n.word_to_num(phrase)
-        formatted = "{:,}".format(num)
-        return f"${formatted}" if has_dollar else formatted
-    except ValueError:
-        return None
+    Used as the rule-based scanner of the cascade: a sentence qualifies when
+    it has a digit, a currency or percent sign, or a number word.
+    """
+    if any(char.isdigit() or char in "$£€¥%" for char in sentence):
+        return True
+    return any(is_number_word(word.strip("()\"'")) for word in sentence.split())
 
 
 def process_claim(claim: str) -> str:
@@ -136,38 +131,69 @@ def process_claim(claim: str) -> str:
         >>> process_claim("I have one hundred twenty three apples.")
         'I have 123 apples.'
     """
-    words = claim.split()  # Split the claim into words.
-    normalized_words = []
-    i = 0
+    return normalize_claim(claim)[0]
+
+
+def normalize_claim(claim: str) -> Tuple[str, OffsetMap]:
+    """Normalize number words in one pass and keep track of offsets.
+
+    Gives the same text as the original window-by-window scan: at every
+    word the longest phrase of up to MAX_PHRASE_WORDS words that is all
+    number words (or a number followed by a multiplier) and converts
+    successfully is replaced, and words are re-joined with single spaces.
+    Each word is classified once, and the length of the run of number words
+    starting at every position is precomputed, so a window check is O(1).
 
-    while i < len(words):
-        max_length = min(
-            4, len(words) - i
-        )  # Maximum number of words to consider.
-        converted = False
-
-        for length in range(max_length, 0, -1):  # Check longer phrases first.
-            phrase_words = words[i : i + length]
-            if all(
-                is_number_word(word.strip(".,")) for word in phrase_words
-            ) or (
-                len(phrase_words) == 2
-                and is_number_word(phrase_words[0].strip("$.,"))
-                and phrase_words[1].lower() in get_multipliers()
+    Args:
+        claim (str): The textual claim containing words and
+        number words.
+
+    Returns:
+        tuple: The normalized claim and an OffsetMap from positions in the
+        normalized claim to positions in ``claim``.
+    """
+    matches = list(_WORD_RE.finditer(claim))
+    words = [match.group() for match in matches]
+    word_count = len(words)
+
+    # number_run[i]: how many consecutive number words start at word i
+    number_run = [0] * (word_count + 1)
+    for i in range(word_count - 1, -1, -1):
+        if is_number_word(words[i].strip(".,")):
+            number_run[i] = number_run[i + 1] + 1
+
+    pieces = []
+    offset_map = OffsetMap()
+    position = 0
+    i = 0
+    while i < word_count:
+        length, number = 1, None
+        for candidate in range(min(MAX_PHRASE_WORDS, word_count - i), 0, -1):
+            if number_run[i] >= candidate or (
+                candidate == 2
+                and words[i + 1].lower() in MULTIPLIERS
+                and is_number_word(words[i].strip("$.,"))
             ):
-                phrase = " ".join(phrase_words)
-                number = convert_phrase(phrase)
+                number = convert_phrase(" ".join(words[i : i + candidate]))
                 if number is not None:
-                    normalized_words.append(number)
-                    i += length  # Skip the processed words.
-                    converted = True
+                    length = candidate
                     break
 
-        if not converted:  # If no conversion was done, keep the original word.
-            normalized_words.append(words[i])
-            i += 1
+        piece = words[i] if number is None else number
+        if pieces:
+            position += 1  # the joining space
+        offset_map.add(
+            position,
+            position + len(piece),
+            matches[i].start(),
+            matches[i + length - 1].end(),
+            verbatim=number is None,
+        )
+        pieces.append(piece)
+        position += len(piece)
+        i += length
 
-    return " ".join(normalized_words)
+    return " ".join(pieces), offset_map
 
 
 def normalize_w2n(url_and_claim: Dict[str, str]) -> Dict[str, str]:
@@ -175,38 +201,87 @@ def normalize_w2n(url_and_claim: Dict[str, str]) -> Dict[str, str]:
     return {url: process_claim(claim) for url, claim in url_and_claim.items()}
 
 
+def normalize_w2n_with_offsets(
+    url_and_claim: Dict[str, str]
+) -> Dict[str, Tuple[str, OffsetMap]]:
+    """Like normalize_w2n, but keeps the offset map of every claim."""
+    return {url: normalize_claim(claim) for url, claim in url_and_claim.items()}
+
+
+def add_raw_doc(result: Dict[str, Any], claim: str, offset_map: OffsetMap) -> None:
+    """Attach the raw claim and its entities projected onto it to a result.
+
+    ``doc_entities`` holds the same entities as ``entities``, with offsets
+    and text taken from the original claim instead of the normalized one.
+    """
+    with stage("offset_adjustment"):
+        result["doc"] = claim
+        result["doc_entities"] = project_entities(result["entities"], offset_map, claim)
+    count("entities", len(result["entities"]))
+
+
 def is_model_available(model_name: str) -> bool:
     """Indicate whether a spaCy model is available.
 
+    Only the installed package metadata is checked; the model is not loaded.
+
     Args:
         model_name (str): Name of the spaCy model.
 
     Returns:
         bool: True if the model is available, False otherwise.
     """
-    try:
-        spacy.load(model_name)
-        return True
-    except Exception:
-        return False
+    return _is_package_installed(model_name)
 
 
-def initialize_spacy() -> Optional[Language]:
+def initialize_spacy(
+    entity_only: bool = False, model_name: str = "en_core_web_trf"
+) -> Optional[Language]:
     """Load the spaCy model and return it.
 
+    The model comes from the process-wide registry, so repeated calls do
+    not load it again.
+
+    Args:
+        entity_only (bool): Exclude the components that do not contribute to
+            ``doc.ents`` (parser, lemmatizer, attribute ruler, ...).
+        model_name (str): Name of the spaCy model.
+
     Returns:
         Language: The spaCy language model.
     """
-    model_name = "en_core_web_trf"
     if not is_model_available(model_name):
         download(model_name)
     try:
-        return spacy.load(model_name)
+        return get_model(model_name, entity_only=entity_only)
     except OSError as e:
         print(f"Error loading spaCy model: {e}")
         return None
 
 
+def initialize_cascade(nlp: Language, scanner: str) -> CascadeNER:
+    """Build a cascade that only sends numeric sentences to ``nlp``.
+
+    Args:
+        nlp (Language): The expensive model, normally en_core_web_trf.
+        scanner (str): "rules" to scan with has_numeric_candidate, or "sm"
+            to scan with en_core_web_sm.
+
+    Returns:
+        CascadeNER: The cascade tagger.
+    """
+    fast_nlp = None
+    if scanner == "sm":
+        fast_nlp = initialize_spacy(entity_only=True, model_name="en_core_web_sm")
+    return CascadeNER(
+        nlp,
+        get_target_entities(),
+        scanner=scanner,
+        detector=has_numeric_candidate,
+        fast_nlp=fast_nlp,
+    )
+
+
 def get_target_entities() -> Set[str]:
     """Return set of entity types we want to classify."""
     return {
@@ -295,59 +370,381 @@ def process_single_claim(
 
 
 def classify_entities(
-    nlp: Language, input_dict: Dict[str, str]
+    nlp: Language,
+    input_dict: Dict[str, str],
+    cache: Optional[EntityCache] = None,
+    cascade: Optional[CascadeNER] = None,
 ) -> Dict[str, Dict[str, Any]]:
-    """Classify entities in claims, return a dictionary of URL-based results."""
+    """Classify entities in claims, return a dictionary of URL-based results.
+
+    Claims whose text is already in the cache are not passed to spaCy. With
+    a cascade, only the sentences it selects reach ``nlp``.
+    """
+    results = tag_claims(nlp, input_dict.values(), cache, cascade)
+    return dict(zip(input_dict.keys(), results))
+
+
+def tag_claims(
+    nlp: Language,
+    claims: Iterable[str],
+    cache: Optional[EntityCache] = None,
+    cascade: Optional[CascadeNER] = None,
+    batch_size: int = 64,
+) -> Iterator[Dict[str, Any]]:
+    """Yield the process_single_claim result of every claim, in order."""
     target_entities = get_target_entities()
     number_words_set = get_number_words_set()
 
-    return {
-        url_id: process_single_claim(
-            nlp(text), number_words_set, target_entities
-        )
-        for url_id, text in input_dict.items()
-    }
+    def extract(doc):
+        return process_single_claim(doc, number_words_set, target_entities)
 
+    if cascade is None:
+        return timed("ner", pipe_cached(nlp, claims, extract, cache, batch_size))
 
-def process_data(data: list) -> Tuple[dict, dict]:
+    def run(uncached):
+        for doc in cascade.pipe(uncached, batch_size=batch_size):
+            yield extract(doc)
+
+    return timed("ner", run_cached(claims, run, cache, cache_window(batch_size)))
+
+
+def open_cache(
+    cache_path: Optional[str],
+    nlp: Language,
+    cascade_scanner: Optional[str] = None,
+    shard_path: Optional[str] = None,
+) -> Optional[EntityCache]:
+    """Open the entity cache for this module, or return None if disabled.
+
+    With ``shard_path``, as in a pool worker, the cache at ``cache_path`` is
+    only read and new results are written to ``shard_path``.
+    """
+    if not cache_path:
+        return None
+    # Cascaded results can differ from a full run, so they are kept apart
+    namespace = f"{CACHE_NAMESPACE}_cascade_{cascade_scanner}" if cascade_scanner else CACHE_NAMESPACE
+    if shard_path:
+        return ShardEntityCache(cache_path, shard_path, nlp, namespace)
+    return EntityCache(cache_path, nlp, namespace)
+
+
+def report_run(cache: Optional[EntityCache], cascade: Optional[CascadeNER]) -> None:
+    """Print cache and cascade statistics and close the cache."""
+    if cascade is not None:
+        print(cascade.report())
+    if cache is not None:
+        print(cache.report())
+        cache.close()
+
+
+def process_data(
+    data: list,
+    cache_path: Optional[str] = None,
+    cascade_scanner: Optional[str] = None,
+    labels: Optional[Iterable[str]] = DEFAULT_LABELS,
+) -> Dict[str, Dict[str, Any]]:
     """Extract claims True statistical claims.
 
     Extracts statistical claims, normalize numbers, classify entities, and
-    return the processed data.
+    return the processed data. Entries are split into label buckets in a
+    single pass and the claims of all buckets are tagged in one batched
+    run, so the cost does not grow with the number of labels. With a cache
+    path, only claims that are new or changed since an earlier run are
+    tagged by spaCy. With a cascade scanner ("rules" or "sm"), only
+    sentences with numeric candidates are tagged by the transformer.
+
+    Returns:
+        dict: label -> {url: result}.
     """
-    nlp = initialize_spacy()
-    false_url_and_claim = url_true_claim_statistical(data, cond=False)
-    true_url_and_claim = url_true_claim_statistical(data, cond=True)
-    false_normalized_claims = normalize_w2n(false_url_and_claim)
-    true_normalized_claims = normalize_w2n(true_url_and_claim)
-    false_result_dict = classify_entities(nlp, false_normalized_claims)
-    true_result_dict = classify_entities(nlp, true_normalized_claims)
-    
-    for url, claim in false_url_and_claim.items():
-        false_result_dict[url]['doc'] = claim
-    for url, claim in true_url_and_claim.items():
-        true_result_dict[url]['doc'] = claim
-
-    return false_result_dict, true_result_dict
-
-
-def main(input_json_path: str, output_json_path1: str, output_json_path2: str):
-    """Loads JSON data, processes it, and saves it."""
-    data = load_json_data(input_json_path)
-    false_result_dict, true_result_dict = process_data(data)
-    with open(output_json_path1, "w") as outfile:
-        json.dump(false_result_dict, outfile, ensure_ascii=False, indent=4)
-    with open(output_json_path2, "w") as outfile:
-        json.dump(true_result_dict, outfile, ensure_ascii=False, indent=4)
+    nlp = initialize_spacy(entity_only=ENTITY_ONLY)
+    cache = open_cache(cache_path, nlp, cascade_scanner)
+    cascade = initialize_cascade(nlp, cascade_scanner) if cascade_scanner else None
+
+    buckets = partition_by_label(data, labels)
+    keys = [(label, url) for label, bucket in buckets.items() for url in bucket]
+    with stage("normalization"):
+        normalized = [normalize_claim(buckets[label][url]) for label, url in keys]
+    results = tag_claims(nlp, (text for text, _ in normalized), cache, cascade)
+
+    result_dicts = {label: {} for label in buckets}
+    for (label, url), (_, offset_map), result in zip(keys, normalized, results):
+        add_raw_doc(result, buckets[label][url], offset_map)
+        result_dicts[label][url] = result
+        progress("claims")
+    report_run(cache, cascade)
+
+    return result_dicts
+
+
+def _iter_normalized_claims(
+    entries: Iterable[Dict[str, Any]], labels: Iterable[str], pending: deque
+) -> Iterator[str]:
+    """Yield normalized claims of matching entries, remembering each entry."""
+    for item in entries:
+        if item.get("label") in labels:
+            with stage("normalization"):
+                normalized, offset_map = normalize_claim(item.get("claim"))
+            pending.append((item, offset_map))
+            yield normalized
+
+
+def iter_tagged_claims(
+    nlp: Language,
+    entries: Iterable[Dict[str, Any]],
+    labels: Iterable[str] = DEFAULT_LABELS,
+    batch_size: int = 64,
+    cache: Optional[EntityCache] = None,
+    cascade: Optional[CascadeNER] = None,
+) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """Tag claims one entry at a time.
+
+    Args:
+        nlp (Language): The spaCy language model.
+        entries: Any iterable of entries, including a lazy file reader.
+        labels: Entry labels to keep.
+        batch_size (int): Number of claims sent to spaCy per batch.
+        cache (EntityCache, optional): Cache of earlier tagging results.
+        cascade (CascadeNER, optional): Cascade that picks the sentences
+            sent to ``nlp``.
+
+    Yields:
+        tuple: The entry label, its URL and the same result dict that
+        process_data produces for it.
+    """
+    pending = deque()
+    claims = _iter_normalized_claims(entries, set(labels), pending)
+    for result in tag_claims(nlp, claims, cache, cascade, batch_size):
+        item, offset_map = pending.popleft()
+        add_raw_doc(result, item.get("claim"), offset_map)
+        progress("claims")
+        yield item.get("label"), item.get("url"), result
+
+
+def main_streaming(
+    input_json_path: str,
+    output_path_template: str,
+    batch_size: int = 64,
+    cache_path: Optional[str] = None,
+    cascade_scanner: Optional[str] = None,
+    labels: Iterable[str] = DEFAULT_LABELS,
+):
+    """Stream entries through the tagger and write each result as JSONL.
+
+    The input may be a JSON array or JSONL. Every output line is one
+    ``{url: result}`` record, so memory stays flat regardless of file size
+    and a crash only loses the entries that were still in flight. Each
+    label goes to ``output_path_template`` with ``{label}`` replaced by
+    label_slug(label).
+    """
+    nlp = initialize_spacy(entity_only=ENTITY_ONLY)
+    cache = open_cache(cache_path, nlp, cascade_scanner)
+    cascade = initialize_cascade(nlp, cascade_scanner) if cascade_scanner else None
+    entries = timed("read", iter_json_records(input_json_path))
+    outputs = {}
+    try:
+        tagged = iter_tagged_claims(
+            nlp, entries, labels, batch_size=batch_size, cache=cache, cascade=cascade
+        )
+        for label, url, result in tagged:
+            with stage("write"):
+                if label not in outputs:
+                    path = output_path_template.format(label=label_slug(label))
+                    outputs[label] = open(path, "w", encoding="utf-8")
+                outputs[label].write(json.dumps({url: result}, ensure_ascii=False) + "\n")
+    finally:
+        for outfile in outputs.values():
+            outfile.close()
+    report_run(cache, cascade)
 
 
-if __name__ == "__main__":
-    # Replace with your input and output file paths
-    input_json_path = "data/binary_data/filtered_new_quantemp_claims_10p_Sample1.json"
-    output_json_path1 = (
-        "data/processed/tagged/new_tagged_claims_10p_Sample_3.json"
+def process_shard(input_path, output_path, options: Dict[str, Any]) -> int:
+    """Tag the claims of one shard in a pool worker.
+
+    The models come from the process-wide registry, so a worker loads them
+    for its first shard and reuses them for the next ones.
+
+    Returns:
+        int: The number of tagged claims.
+    """
+    nlp = initialize_spacy(entity_only=ENTITY_ONLY)
+    cache = open_cache(options["cache"], nlp, options["cascade"], shard_cache_path(output_path))
+    cascade = initialize_cascade(nlp, options["cascade"]) if options["cascade"] else None
+    labels = set(options["labels"])
+    indices = deque()
+
+    def entries():
+        for index, entry in timed("read", iter_shard_input(input_path)):
+            if entry.get("label") in labels:
+                indices.append(index)
+                yield entry
+
+    tagged = iter_tagged_claims(nlp, entries(), labels, cache=cache, cascade=cascade)
+    records = (
+        {"index": indices.popleft(), "label": label, "url": url, "result": result}
+        for label, url, result in tagged
+    )
+    try:
+        return write_shard_output(output_path, records)
+    finally:
+        report_run(cache, cascade)
+
+
+def main_sharded(
+    input_json_path: str,
+    output_path_template: str,
+    shards: int,
+    workers: Optional[int] = None,
+    shard_dir: Optional[str] = None,
+    cache_path: Optional[str] = None,
+    cascade_scanner: Optional[str] = None,
+    labels: Iterable[str] = DEFAULT_LABELS,
+    stream: bool = False,
+    profile: bool = False,
+):
+    """Tag the input in url-hashed shards on a process pool.
+
+    Writes the same files as main (or main_streaming with ``stream``), in
+    the same order, whatever the number of shards. Shard files are kept in
+    ``shard_dir`` until the merge succeeds; rerunning after a failure only
+    processes the shards that have no output yet. With ``profile``, the
+    workers' stage metrics are merged into this process's metrics.
+    """
+    labels = tuple(labels)
+    shard_dir = shard_dir or output_path_template.format(label="all") + ".shards"
+    options = {"cache": cache_path, "cascade": cascade_scanner, "labels": labels, "profile": profile}
+    with stage("shard_pool"):
+        merged = run_sharded(input_json_path, shard_dir, shards, workers or shards, process_shard, options)
+
+    if stream:
+        outputs = {}
+        try:
+            for record in merged:
+                label = record["label"]
+                with stage("write"):
+                    if label not in outputs:
+                        path = output_path_template.format(label=label_slug(label))
+                        outputs[label] = open(path, "w", encoding="utf-8")
+                    outputs[label].write(json.dumps({record["url"]: record["result"]}, ensure_ascii=False) + "\n")
+        finally:
+            for outfile in outputs.values():
+                outfile.close()
+    else:
+        result_dicts = {label: {} for label in labels}
+        for record in merged:
+            result_dicts[record["label"]][record["url"]] = record["result"]
+        for label, result_dict in result_dicts.items():
+            output_path = output_path_template.format(label=label_slug(label))
+            with stage("write"), open(output_path, "w") as outfile:
+                json.dump(result_dict, outfile, ensure_ascii=False, indent=4)
+    if cache_path:
+        merge_caches(cache_path, shard_cache_paths(shard_dir, shards))
+    remove_shards(shard_dir, shards)
+
+
+def main(
+    input_json_path: str,
+    output_path_template: str,
+    cache_path: Optional[str] = None,
+    cascade_scanner: Optional[str] = None,
+    labels: Optional[Iterable[str]] = DEFAULT_LABELS,
+):
+    """Loads JSON data, processes it, and saves one file per label.
+
+    ``output_path_template`` must contain ``{label}``, which is replaced by
+    label_slug(label), e.g. "tagged_{label}.json" -> "tagged_false.json".
+    """
+    data = load_json_data(input_json_path)
+    result_dicts = process_data(data, cache_path, cascade_scanner, labels)
+    for label, result_dict in result_dicts.items():
+        output_path = output_path_template.format(label=label_slug(label))
+        with stage("write"), open(output_path, "w") as outfile:
+            json.dump(result_dict, outfile, ensure_ascii=False, indent=4)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command line of this module."""
+    parser = argparse.ArgumentParser(description="Normalize and tag claims per label.")
+    parser.add_argument(
+        "--input",
+        default="data/binary_data/filtered_new_quantemp_claims_10p_Sample1.json",
+        help="JSON array or JSONL file with entries.",
+    )
+    parser.add_argument(
+        "--output",
+        default="data/processed/tagged/new_tagged_claims_10p_Sample_{label}.json",
+        help="Output path template; {label} is replaced per label.",
+    )
+    parser.add_argument(
+        "--label",
+        action="append",
+        dest="labels",
+        help="Label to tag (repeatable). Defaults to False, True and Half True/False.",
+    )
+    parser.add_argument("--stream", action="store_true", help="Write JSONL as entries are tagged.")
+    parser.add_argument("--cache", default=None, help="SQLite entity cache file.")
+    parser.add_argument("--cascade", choices=["rules", "sm"], default=None)
+    parser.add_argument(
+        "--cold-start",
+        action="store_true",
+        help="Only report import and model load time, then exit.",
     )
-    output_json_path2 = (
-        "data/processed/tagged/new_tagged_claims_10p_Sample_4.json"
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=0,
+        help="Split the input into this many shards by url and tag them in a process pool.",
     )
-    main(input_json_path, output_json_path1, output_json_path2)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for --shards (default: one per shard).",
+    )
+    parser.add_argument(
+        "--shard-dir",
+        default=None,
+        help="Where shard files are kept until the merge; rerun with it to retry failed shards.",
+    )
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def cli(argv: Optional[List[str]] = None):
+    """Command line entry point."""
+    args = parse_args(argv)
+    labels = tuple(args.labels) if args.labels else DEFAULT_LABELS
+    if args.cold_start:
+        print(cold_start_report(IMPORT_SECONDS, "en_core_web_trf", ENTITY_ONLY))
+        return
+    start_profile(args.profile, args.profile_stage)
+    if args.shards:
+        main_sharded(
+            args.input,
+            args.output,
+            args.shards,
+            workers=args.workers,
+            shard_dir=args.shard_dir,
+            cache_path=args.cache,
+            cascade_scanner=args.cascade,
+            labels=labels,
+            stream=args.stream,
+            profile=bool(args.profile),
+        )
+    elif args.stream:
+        main_streaming(
+            args.input,
+            args.output,
+            cache_path=args.cache,
+            cascade_scanner=args.cascade,
+            labels=labels,
+        )
+    else:
+        main(args.input, args.output, args.cache, args.cascade, labels)
+    finish_profile(args.profile, {"script": "process_claims"})
+
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,218 @@
+"""Propose MATCHES/INCONSISTENT relations between claim and document numbers."""
+
+import math
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from numeric_values import parse_numeric
+
+# Relative difference still treated as the same number, e.g. a claim of
+# "$1.9 billion" for "1,930,000,000" in the document
+MATCH_TOLERANCE = 0.05
+
+# Unmatched claim numbers are proposed as INCONSISTENT with the nearest
+# document number of the same kind and unit, if it is within this factor
+INCONSISTENT_RATIO = 2.0
+
+# Labels whose values are only compared with each other, and only exactly:
+# 2018 is not a rounded 2019
+KIND_BY_LABEL = {"DATE": "date", "TIME": "time", "ORDINAL": "ordinal"}
+
+# Words left out when comparing dates, so "the 5th of May" is "May 5th"
+FILLER_WORDS = {"the", "of", "on", "in", "at"}
+
+# Kinds compared with MATCH_TOLERANCE, and proposed as INCONSISTENT when they differ
+APPROXIMATE_KINDS = {"amount", "percent"}
+
+
+class SpanValue(NamedTuple):
+    """Canonical value of a numerical span."""
+
+    kind: str
+    magnitude: float
+    currency: Optional[str]
+    unit: Optional[str]
+    # Normalized words and numbers of the whole span, compared for exact kinds
+    form: Optional[Tuple[str, ...]] = None
+
+
+def exact_form(text: str) -> Tuple[str, ...]:
+    """Return the words and numbers of a date, time or ordinal, in sorted order.
+
+    Punctuation and filler words are dropped and numbers are written in one
+    way, so "May 5, 2019", "5 May 2019" and "the 05 of May 2019" are the
+    same date, while "June 5, 2020" is not.
+    """
+    parts = []
+    for part in re.findall(r"[^\W\d_]+|\d+(?:\.\d+)?", text.lower()):
+        if part in FILLER_WORDS:
+            continue
+        parts.append(format(float(part), "g") if part[0].isdigit() else part)
+    return tuple(sorted(parts))
+
+
+def canonical_value(text: str, label: str) -> Optional[SpanValue]:
+    """Normalize a span's text with parse_numeric, or None if it has no readable number.
+
+    Percentages, dates, times and ordinals each form their own kind; all
+    other numbers (money, cardinals, quantities) are comparable amounts.
+    Dates, times and ordinals also keep the normalized form of the whole
+    span, since their first number alone (the 5 of "May 5, 2019") says
+    little.
+    """
+    value = parse_numeric(text)
+    if value.magnitude is None:
+        return None
+    kind = "percent" if value.is_percent or label == "PERCENT" else KIND_BY_LABEL.get(label, "amount")
+    form = exact_form(text) if kind not in APPROXIMATE_KINDS else None
+    return SpanValue(kind, value.magnitude, value.currency, value.unit, form)
+
+
+def tolerance_bucket(magnitude: float, tolerance: float) -> Tuple[int, int]:
+    """Return the (sign, log-scale bucket) of a value.
+
+    Buckets are -log(1 - tolerance) wide, so two values within ``tolerance``
+    of each other always land in the same or neighbouring buckets. The
+    width gets a little slack so that rounding in the logarithm cannot push
+    two values exactly ``tolerance`` apart two buckets apart.
+    """
+    if magnitude == 0:
+        return 0, 0
+    sign = 1 if magnitude > 0 else -1
+    width = -math.log1p(-tolerance) * (1 + 1e-9)
+    return sign, math.floor(math.log(abs(magnitude)) / width)
+
+
+def value_key(value: SpanValue, tolerance: float) -> tuple:
+    """Hash key of a value: its kind and unit plus a tolerance bucket, or the exact form."""
+    if value.kind in APPROXIMATE_KINDS:
+        return value.kind, value.unit, tolerance_bucket(value.magnitude, tolerance)
+    return value.kind, value.form
+
+
+def neighbour_keys(value: SpanValue, tolerance: float) -> List[tuple]:
+    """Keys of every bucket that can hold a value matching this one."""
+    if value.kind not in APPROXIMATE_KINDS:
+        return [value_key(value, tolerance)]
+    sign, bucket = tolerance_bucket(value.magnitude, tolerance)
+    return [(value.kind, value.unit, (sign, bucket + offset)) for offset in (-1, 0, 1)]
+
+
+def comparable(a: SpanValue, b: SpanValue) -> bool:
+    """Whether two values are the same kind of number, and so can match or be inconsistent.
+
+    The units must be the same. A currency on only one side is allowed, so
+    "$2 billion" compares with "2,000,000,000", but two different
+    currencies are not compared.
+    """
+    if a.kind != b.kind or a.unit != b.unit:
+        return False
+    return not (a.currency and b.currency and a.currency != b.currency)
+
+
+def values_match(a: SpanValue, b: SpanValue, tolerance: float) -> bool:
+    if not comparable(a, b):
+        return False
+    if a.kind not in APPROXIMATE_KINDS:
+        return a.form == b.form
+    return math.isclose(a.magnitude, b.magnitude, rel_tol=tolerance)
+
+
+def relation(head: Dict[str, Any], child: Dict[str, Any], label: str) -> Dict[str, Any]:
+    """A Prodigy relation from the head span to the child span."""
+    def span_info(span):
+        return {key: span[key] for key in ("start", "end", "token_start", "token_end", "label") if key in span}
+
+    return {
+        "head": head.get("token_end", head.get("token_start")),
+        "child": child.get("token_end", child.get("token_start")),
+        "head_span": span_info(head),
+        "child_span": span_info(child),
+        "label": label,
+    }
+
+
+def propose_relations(
+    text: str,
+    spans: List[Dict[str, Any]],
+    claim: Optional[Tuple[int, int]],
+    tolerance: float = MATCH_TOLERANCE,
+) -> List[Dict[str, Any]]:
+    """Suggest relations from the claim's numbers to the document's numbers.
+
+    The document's values are put in a hash index keyed by (kind, tolerance
+    bucket), and every claim value is joined against its own and the
+    neighbouring buckets, so a task costs O(claim + document spans) instead
+    of comparing every pair. Dates, times and ordinals only match exactly.
+    Claim amounts and percentages without a match are proposed as
+    INCONSISTENT with the nearest comparable document value, found by
+    binary search. Both use the rule of ``comparable``: same kind and unit,
+    and no conflicting currencies.
+
+    Args:
+        text (str): The task text the span offsets refer to.
+        spans (list): The task's numerical spans.
+        claim (tuple): Start and end offset of the claim in the text.
+        tolerance (float): Relative difference still counted as a match.
+
+    Returns:
+        list: Prodigy relations with the claim span as head.
+    """
+    if claim is None:
+        return []
+
+    claim_values, index = [], defaultdict(list)
+    # (kind, unit) -> currency -> sorted (magnitude, position)
+    nearest: Dict[tuple, Dict[Optional[str], List[Tuple[float, int]]]] = defaultdict(lambda: defaultdict(list))
+    doc_spans = []
+    for span in spans:
+        value = canonical_value(text[span["start"]:span["end"]], span["label"])
+        if value is None:
+            continue
+        if claim[0] <= span["start"] and span["end"] <= claim[1]:
+            claim_values.append((span, value))
+        elif span["start"] >= claim[1]:
+            position = len(doc_spans)
+            doc_spans.append((span, value))
+            index[value_key(value, tolerance)].append(position)
+            nearest[(value.kind, value.unit)][value.currency].append((value.magnitude, position))
+    for by_currency in nearest.values():
+        for values in by_currency.values():
+            values.sort()
+
+    relations = []
+    for span, value in claim_values:
+        matches = sorted(
+            position
+            for key in neighbour_keys(value, tolerance)
+            for position in index.get(key, ())
+            if values_match(value, doc_spans[position][1], tolerance)
+        )
+        if matches:
+            relations.extend(relation(span, doc_spans[position][0], "MATCHES") for position in matches)
+            continue
+        if value.kind not in APPROXIMATE_KINDS:
+            continue
+
+        by_currency = nearest.get((value.kind, value.unit), {})
+        if value.currency is None:
+            lists = list(by_currency.values())
+        else:
+            lists = [by_currency.get(value.currency, []), by_currency.get(None, [])]
+        closest = None
+        for candidates in lists:
+            i = bisect_left(candidates, (value.magnitude, -1))
+            for candidate in candidates[max(i - 1, 0):i + 1]:
+                if closest is None or abs(candidate[0] - value.magnitude) < abs(closest[0] - value.magnitude):
+                    closest = candidate
+        if closest is not None and _within_ratio(value.magnitude, closest[0], INCONSISTENT_RATIO):
+            relations.append(relation(span, doc_spans[closest[1]][0], "INCONSISTENT"))
+    return relations
+
+
+def _within_ratio(a: float, b: float, ratio: float) -> bool:
+    if a == 0 or b == 0 or (a > 0) != (b > 0):
+        return False
+    return max(abs(a), abs(b)) / min(abs(a), abs(b)) <= ratio
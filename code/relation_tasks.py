@@ -0,0 +1,390 @@
+"""Build relation annotation tasks from saved NER examples."""
+
+import html
+import json
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from ner_tasks import CLAIM_PREFIX, DOC_PREFIX, FEEDBACK_INSTRUCTIONS, NUMERICAL_LABELS
+from relation_proposals import propose_relations
+
+NUMERICAL_MARK = "<mark style='background-color: #ffcc80'>"
+CLAIM_HIGHLIGHT = "<span style='background-color: #d0ebff'>"
+
+# Placed between two context windows in the windowed task text
+WINDOW_SEPARATOR = " [...] "
+
+# Renders the full context of windowed tasks the first time its <details>
+# element is opened. The raw text and offsets are fetched from the context
+# server by task["context_key"], so they are never part of the task itself
+LAZY_CONTEXT_JS = """
+var CONTEXT_BASE = __CONTEXT_BASE__;
+var CONTEXT_PORT = __CONTEXT_PORT__;
+var CONTEXT_TOKEN = __CONTEXT_TOKEN__;
+document.addEventListener('toggle', function (event) {
+    var details = event.target;
+    if (!details.classList || !details.classList.contains('lazy-context') || !details.open) return;
+    var task = window.prodigy && window.prodigy.content;
+    var body = details.querySelector('.lazy-context-body');
+    if (!task || !task.context_key || !body || body.dataset.rendered === task.context_key) return;
+    var key = task.context_key;
+    body.dataset.rendered = key;
+    // The context server speaks plain HTTP; behind HTTPS it must be proxied
+    // and its address passed as --context-url, or the browser blocks it
+    var base = CONTEXT_BASE || 'http://' + window.location.hostname + ':' + CONTEXT_PORT;
+    if (window.location.protocol === 'https:' && base.indexOf('https:') !== 0) {
+        body.textContent = 'The full context needs --context-url when Prodigy is served over HTTPS.';
+        delete body.dataset.rendered;
+        return;
+    }
+    body.textContent = 'Loading full context...';
+    var escape = function (value) {
+        return value.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+            .replace(/"/g, '&quot;').replace(/'/g, '&#x27;');
+    };
+    var tags = {
+        claim: ["<span style='background-color: #d0ebff'>", '</span>'],
+        numerical: ["<mark style='background-color: #ffcc80'>", '</mark>']
+    };
+    var render = function (context) {
+        // The annotator may have moved on to another task meanwhile
+        if (body.dataset.rendered !== key) return;
+        var text = context.text;
+        // Same ordering as highlight_numericals: closing tags first, wider marks
+        // open first, and the claim stays outside an equally wide mark
+        var events = [];
+        context.marks.forEach(function (mark) {
+            var claim = mark[2] === 'claim' ? 0 : 1;
+            events.push([mark[0], 1, -mark[1], claim, tags[mark[2]][0]]);
+            events.push([mark[1], 0, -mark[0], 1 - claim, tags[mark[2]][1]]);
+        });
+        events.sort(function (a, b) { return a[0] - b[0] || a[1] - b[1] || a[2] - b[2] || a[3] - b[3]; });
+        var parts = [];
+        var last = 0;
+        events.forEach(function (e) {
+            parts.push(escape(text.slice(last, e[0])), e[4]);
+            last = e[0];
+        });
+        parts.push(escape(text.slice(last)));
+        body.innerHTML = parts.join('');
+    };
+    var url = base.replace(/\\/$/, '') + '/context/' + key + '?token=' + encodeURIComponent(CONTEXT_TOKEN);
+    fetch(url).then(function (response) {
+        if (!response.ok) throw new Error(response.status);
+        return response.json();
+    }).then(render).catch(function () {
+        if (body.dataset.rendered !== key) return;
+        body.textContent = 'Full context unavailable, reopen to retry.';
+        delete body.dataset.rendered;
+    });
+}, true);
+"""
+
+
+def lazy_context_js(port: int, token: str, base_url: Optional[str] = None) -> str:
+    """Return LAZY_CONTEXT_JS for a context server.
+
+    Args:
+        port (int): Port of the context server, on the annotation page's host.
+        token (str): Token the context server requires.
+        base_url (str): Address of the context server if it is not reached
+            directly, e.g. through an HTTPS reverse proxy; overrides ``port``.
+    """
+    return (LAZY_CONTEXT_JS.replace("__CONTEXT_BASE__", json.dumps(base_url))
+            .replace("__CONTEXT_PORT__", str(int(port)))
+            .replace("__CONTEXT_TOKEN__", json.dumps(token)))
+
+
+def merge_intervals(spans: List[Dict[str, Any]]) -> Tuple[List[int], List[int]]:
+    """Merge spans into sorted, disjoint [start, end) intervals.
+
+    Returns:
+        tuple: The interval starts and the matching ends, both sorted.
+    """
+    starts, ends = [], []
+    for span in sorted(spans, key=lambda s: s["start"]):
+        if ends and span["start"] < ends[-1]:
+            ends[-1] = max(ends[-1], span["end"])
+        else:
+            starts.append(span["start"])
+            ends.append(span["end"])
+    return starts, ends
+
+
+def tokens_in_spans(tokens: List[Dict[str, Any]], spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return the tokens that start inside any of the spans.
+
+    Same result as testing every token against every span, but runs in
+    O((n + m) log m) for n tokens and m spans: the spans are merged into
+    disjoint intervals once and each token is placed with a binary search.
+    """
+    starts, ends = merge_intervals(spans)
+    selected = []
+    for token in tokens:
+        index = bisect_right(starts, token["start"]) - 1
+        if index >= 0 and token["start"] < ends[index]:
+            selected.append(token)
+    return selected
+
+
+def highlight_numericals(
+    text: str, spans: List[Dict[str, Any]], claim: Optional[Tuple[int, int]] = None
+) -> str:
+    """Escape text, wrap every span in a <mark> and highlight the claim.
+
+    Builds the HTML in one linear pass over the text from the span and claim
+    offsets. The pieces are collected in a list and joined once instead of
+    growing a string with +=, which is quadratic on long documents.
+
+    Args:
+        text (str): The task text.
+        spans (list): Numerical spans to mark.
+        claim (tuple): Start and end offset of the claim, if it should be
+            highlighted.
+    """
+    # (offset, opens, -other end, nesting, tag): closing tags sort before
+    # opening ones at the same offset, wider elements open first and the
+    # claim stays outside a mark that covers all of it
+    events = []
+    for s in spans:
+        events.append((s["start"], 1, -s["end"], 1, NUMERICAL_MARK))
+        events.append((s["end"], 0, -s["start"], 0, "</mark>"))
+    if claim is not None:
+        events.append((claim[0], 1, -claim[1], 0, CLAIM_HIGHLIGHT))
+        events.append((claim[1], 0, -claim[0], 1, "</span>"))
+    events.sort()
+
+    parts = []
+    last_end = 0
+    for offset, _, _, _, tag in events:
+        parts.append(html.escape(text[last_end:offset]))
+        parts.append(tag)
+        last_end = offset
+    parts.append(html.escape(text[last_end:]))
+    return "".join(parts)
+
+
+def context_block(combined_html: str) -> str:
+    """Wrap the highlighted document in a collapsible <details> element."""
+    return f"""
+            <details style="margin-top:10px;">
+                <summary><strong>Show Full Context</strong></summary>
+                <div style='white-space: pre-wrap; font-family: monospace; font-size: 14px; padding: 12px; border-top: 1px solid #ddd; background: #f9f9f9;'>
+                    {combined_html}
+                </div>
+            </details>
+        """
+
+
+def lazy_context_block(window_html: str) -> str:
+    """Show the context windows, with the full context filled in on demand.
+
+    The <details> body stays empty until LAZY_CONTEXT_JS fetches and
+    renders the task's context the first time it is opened.
+    """
+    return f"""
+            <div style='white-space: pre-wrap; font-family: monospace; font-size: 14px; padding: 12px; background: #f9f9f9;'>{window_html}</div>
+            <details class="lazy-context" style="margin-top:10px;">
+                <summary><strong>Show Full Context</strong></summary>
+                <div class="lazy-context-body" style='white-space: pre-wrap; font-family: monospace; font-size: 14px; padding: 12px; border-top: 1px solid #ddd; background: #f9f9f9;'></div>
+            </details>
+        """
+
+
+def section_bounds(eg: Dict[str, Any]) -> Tuple[Optional[Tuple[int, int]], Tuple[int, int]]:
+    """Return the (start, end) offsets of the claim and of the document.
+
+    Uses the offsets the NER recipe stores in meta. Examples saved before
+    that fall back to locating the section prefixes in the text. The claim
+    is None if it cannot be found.
+    """
+    meta = eg.get("meta") or {}
+    if all(key in meta for key in ("claim_start", "claim_end", "doc_start", "doc_end")):
+        return (meta["claim_start"], meta["claim_end"]), (meta["doc_start"], meta["doc_end"])
+
+    text = eg["text"]
+    claim_start = text.find(CLAIM_PREFIX)
+    prefix_start = text.find(DOC_PREFIX, max(claim_start, 0))
+    if prefix_start < 0:
+        return None, (len(text), len(text))
+    claim = (claim_start + len(CLAIM_PREFIX), prefix_start) if claim_start >= 0 else None
+    doc_start = prefix_start + len(DOC_PREFIX)
+    doc_end = text.rfind(FEEDBACK_INSTRUCTIONS, doc_start)
+    return claim, (doc_start, doc_end if doc_end >= 0 else len(text))
+
+
+def context_windows(
+    document: Tuple[int, int], spans: List[Dict[str, Any]], tokens: List[Dict[str, Any]], window: int
+) -> List[Tuple[int, int]]:
+    """Return the parts of the text to send for a windowed task.
+
+    Everything up to the start of the document (label and claim) is kept,
+    followed by ``window`` characters on either side of every span in the
+    document. Windows are widened to whole tokens and overlapping ones are
+    merged.
+    """
+    doc_start, doc_end = document
+    token_starts = [t["start"] for t in tokens]
+    token_ends = [t["end"] for t in tokens]
+    segments = [(0, doc_start)]
+    for span in sorted(spans, key=lambda s: s["start"]):
+        if span["start"] < doc_start:
+            continue
+        start = max(doc_start, span["start"] - window)
+        end = min(doc_end, span["end"] + window)
+        index = bisect_right(token_starts, start) - 1
+        if index >= 0 and token_ends[index] > start:
+            start = max(doc_start, token_starts[index])
+        index = bisect_right(token_starts, end) - 1
+        if index >= 0 and token_ends[index] > end:
+            end = min(doc_end, token_ends[index])
+        if start <= segments[-1][1]:
+            segments[-1] = (segments[-1][0], max(segments[-1][1], end))
+        else:
+            segments.append((start, end))
+    return segments
+
+
+def window_text(text: str, segments: List[Tuple[int, int]]) -> Tuple[str, List[int]]:
+    """Join the segments of the text, separated by WINDOW_SEPARATOR.
+
+    Returns:
+        tuple: The windowed text and the offset each segment starts at in it.
+    """
+    parts, placed = [], []
+    position = 0
+    for index, (start, end) in enumerate(segments):
+        if index:
+            parts.append(WINDOW_SEPARATOR)
+            position += len(WINDOW_SEPARATOR)
+        parts.append(text[start:end])
+        placed.append(position)
+        position += end - start
+    return "".join(parts), placed
+
+
+def remap_offsets(items: List[Dict[str, Any]], segments: List[Tuple[int, int]], placed: List[int]) -> List[Dict[str, Any]]:
+    """Copy spans or tokens with their offsets moved into the windowed text.
+
+    Items outside every segment are dropped.
+    """
+    segment_starts = [start for start, _ in segments]
+    remapped = []
+    for item in items:
+        index = bisect_right(segment_starts, item["start"]) - 1
+        if index < 0 or item["end"] > segments[index][1]:
+            continue
+        shift = placed[index] - segments[index][0]
+        remapped.append(dict(item, start=item["start"] + shift, end=item["end"] + shift))
+    return remapped
+
+
+def document_offsets(window_segments: List[List[int]], start: int, end: int) -> Optional[Tuple[int, int]]:
+    """Map a [start, end) range of a windowed task's text back onto the full text.
+
+    Args:
+        window_segments (list): The task's meta["window_segments"].
+        start (int): Start offset in the windowed text.
+        end (int): End offset in the windowed text.
+
+    Returns:
+        tuple: The offsets in the full text, or None if the range is not
+        inside a single segment (e.g. it covers a WINDOW_SEPARATOR).
+    """
+    index = bisect_right([at for _, _, at in window_segments], start) - 1
+    if index < 0:
+        return None
+    segment_start, segment_end, at = window_segments[index]
+    if end - at > segment_end - segment_start:
+        return None
+    return start - at + segment_start, end - at + segment_start
+
+
+def build_windowed_task(
+    eg: Dict[str, Any], numerical_spans: List[Dict[str, Any]], numerical_tokens: List[Dict[str, Any]],
+    tokens: List[Dict[str, Any]], window: int, contexts
+) -> Dict[str, Any]:
+    """Build a relation task that only carries the claim and context windows.
+
+    Token ids and span token indices are unchanged, only character offsets
+    move. ``meta["window_segments"]`` lists every kept [start, end) of the
+    full text with the offset it starts at in the task text, so saved spans
+    and relations can be mapped back with document_offsets. The full text
+    and its marks go into ``contexts`` instead of the task, which only
+    carries the key the browser fetches them by when the annotator asks for
+    the full context.
+    """
+    text = eg["text"]
+    claim, document = section_bounds(eg)
+    segments = context_windows(document, numerical_spans, tokens, window)
+    windowed, placed = window_text(text, segments)
+    spans = remap_offsets(numerical_spans, segments, placed)
+
+    # The claim comes before the document, so its offsets are the same in
+    # the windowed text
+    marks = [[s["start"], s["end"], "numerical"] for s in numerical_spans]
+    if claim is not None:
+        marks.append([claim[0], claim[1], "claim"])
+
+    return {
+        "text": windowed,
+        "tokens": remap_offsets(numerical_tokens, segments, placed),
+        "spans": spans,
+        "relations": [],
+        "_input_hash": eg.get("_input_hash"),
+        "meta": {
+            "url": (eg.get("meta") or {}).get("url", ""),
+            "window_segments": [[start, end, at] for (start, end), at in zip(segments, placed)],
+        },
+        "html": lazy_context_block(highlight_numericals(windowed, spans, claim)),
+        "context_key": contexts.put(text, {"text": text, "marks": marks}),
+    }
+
+
+def build_relation_task(
+    eg: Dict[str, Any], tokens: List[Dict[str, Any]], window: Optional[int] = None, propose: bool = False,
+    contexts=None
+) -> Dict[str, Any]:
+    """Turn a saved NER example into a relation annotation task.
+
+    Args:
+        eg (dict): The NER example with text and spans.
+        tokens (list): All tokens of the example's text.
+        window (int): If set, only send the claim and this many characters
+            of document context around each numerical span.
+        propose (bool): Pre-fill MATCHES/INCONSISTENT relations between the
+            claim's and the document's numbers as suggestions.
+        contexts (ContextStore): Where windowed tasks put their full
+            context for the context server. Required with ``window``.
+
+    Returns:
+        dict: Task with the numerical spans, the tokens inside them and the
+        highlighted full context as HTML.
+    """
+    text = eg["text"]
+    spans = eg.get("spans", [])
+
+    numerical_spans = [s for s in spans if s["label"] in NUMERICAL_LABELS]
+    numerical_tokens = tokens_in_spans(tokens, numerical_spans)
+
+    if window is not None:
+        task = build_windowed_task(eg, numerical_spans, numerical_tokens, tokens, window, contexts)
+    else:
+        # Generate collapsible HTML
+        claim, _ = section_bounds(eg)
+        combined_html = highlight_numericals(text, numerical_spans, claim)
+
+        task = {
+            "text": text,
+            "tokens": numerical_tokens,
+            "spans": numerical_spans,
+            "relations": [],
+            "_input_hash": eg.get("_input_hash"),
+            "html": context_block(combined_html)
+        }
+
+    if propose:
+        # The claim precedes the document, so its offsets hold in windowed tasks too
+        claim, _ = section_bounds(eg)
+        task["relations"] = propose_relations(task["text"], task["spans"], claim)
+    return task
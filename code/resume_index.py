@@ -0,0 +1,60 @@
+"""Compact index of already-annotated input hashes, used to resume streams."""
+
+from array import array
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+
+class HashIndex:
+    """Sorted array of 64-bit hashes with O(log n) membership tests.
+
+    Uses 8 bytes per hash, a fraction of what a Python set of ints needs,
+    so indexes of large datasets stay small.
+    """
+
+    def __init__(self, hashes: Iterable[int] = ()):
+        self.hashes = array("q", sorted(set(hashes)))
+
+    def __contains__(self, value: Optional[int]) -> bool:
+        if value is None:
+            return False
+        index = bisect_left(self.hashes, value)
+        return index < len(self.hashes) and self.hashes[index] == value
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def intersection(self, other: "HashIndex") -> "HashIndex":
+        """Return the hashes present in both indexes."""
+        return HashIndex(value for value in self.hashes if value in other)
+
+
+def skip_annotated(
+    stream: Iterable[Dict[str, Any]],
+    done: HashIndex,
+    input_hash: Callable[[Dict[str, Any]], int],
+    log: Callable[[str], None] = print,
+) -> Iterator[Dict[str, Any]]:
+    """Drop tasks whose input hash is already in the index.
+
+    Runs before tokenization and rendering, so completed tasks cost only a
+    hash computation. The number of skipped tasks is logged when the first
+    remaining task is reached and again at the end of the stream.
+
+    Args:
+        stream: Untokenized tasks.
+        done (HashIndex): Input hashes of completed tasks.
+        input_hash: Returns (and may store) a task's input hash.
+        log: Where to report the number of skipped tasks.
+    """
+    skipped = 0
+    reported = False
+    for task in stream:
+        if input_hash(task) in done:
+            skipped += 1
+            continue
+        if not reported:
+            log(f"Resume: skipped {skipped} already-annotated tasks before the first open task")
+            reported = True
+        yield task
+    log(f"Resume: skipped {skipped} already-annotated tasks in total")
@@ -0,0 +1,201 @@
+"""Split entries into url-hashed shards, process them in a pool and merge the results in input order."""
+
+import hashlib
+import heapq
+import json
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+import instrumentation
+from json_stream import iter_json_records
+
+MANIFEST_NAME = "manifest.json"
+
+
+def shard_of(url: str, n_shards: int) -> int:
+    """Stable shard number of a url; unlike hash(), the same in every process and run."""
+    digest = hashlib.sha1((url or "").encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % n_shards
+
+
+def shard_input_path(shard_dir, shard: int) -> Path:
+    return Path(shard_dir) / f"shard-{shard:04d}.input.jsonl"
+
+
+def shard_output_path(shard_dir, shard: int) -> Path:
+    return Path(shard_dir) / f"shard-{shard:04d}.output.jsonl"
+
+
+def shard_cache_path(output_path) -> Path:
+    """Entity cache file of the worker that writes a shard's output file."""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name.replace(".output.jsonl", ".cache.sqlite"))
+
+
+def shard_cache_paths(shard_dir, n_shards: int) -> List[Path]:
+    return [shard_cache_path(shard_output_path(shard_dir, shard)) for shard in range(n_shards)]
+
+
+def shard_metrics_path(shard_dir, shard: int) -> Path:
+    return Path(shard_dir) / f"shard-{shard:04d}.metrics.json"
+
+
+def split_into_shards(input_path, shard_dir, n_shards: int) -> int:
+    """Write every entry, with its input position, to the shard of its url.
+
+    The split is skipped when ``shard_dir`` already holds a split of the
+    same input into the same number of shards, so a rerun after a failure
+    reuses it together with the outputs of the shards that finished. If
+    the input file changed since (its size or modification time differ),
+    it is split again and all shards are redone.
+
+    Returns:
+        int: The number of entries.
+    """
+    shard_dir = Path(shard_dir)
+    manifest_path = shard_dir / MANIFEST_NAME
+    stat = Path(input_path).stat()
+    manifest = {"input": str(Path(input_path).resolve()), "shards": n_shards}
+    version = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if manifest_path.exists():
+        existing = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if {key: existing.get(key) for key in manifest} != manifest:
+            raise ValueError(f"{shard_dir} holds shards of another input or shard count; use a new --shard-dir")
+        if {key: existing.get(key) for key in version} == version:
+            return existing["entries"]
+        print(f"{input_path} changed since it was split into {shard_dir}; splitting it again")
+        manifest_path.unlink()
+
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    for shard in range(n_shards):
+        for path in (shard_output_path(shard_dir, shard), shard_metrics_path(shard_dir, shard),
+                     shard_cache_path(shard_output_path(shard_dir, shard))):
+            path.unlink(missing_ok=True)
+    files = [open(shard_input_path(shard_dir, shard), "w", encoding="utf-8") for shard in range(n_shards)]
+    count = 0
+    try:
+        for index, entry in enumerate(iter_json_records(input_path)):
+            line = json.dumps({"index": index, "entry": entry}, ensure_ascii=False)
+            files[shard_of(entry.get("url", ""), n_shards)].write(line + "\n")
+            count += 1
+    finally:
+        for f in files:
+            f.close()
+    # Written last: a split interrupted half-way is redone on the next run
+    manifest_path.write_text(json.dumps(dict(manifest, **version, entries=count)), encoding="utf-8")
+    return count
+
+
+def iter_shard_input(path) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (input position, entry) of every entry in a shard input file."""
+    for record in iter_json_records(path):
+        yield record["index"], record["entry"]
+
+
+def write_shard_output(path, records: Iterable[Dict[str, Any]]) -> int:
+    """Write a shard's output records, replacing the file only once all are written.
+
+    Each record must carry the "index" of its entry. A shard that fails
+    part-way leaves no output file, so it counts as not done.
+    """
+    path = Path(path)
+    partial = path.with_name(path.name + ".partial")
+    count = 0
+    with open(partial, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(partial, path)
+    return count
+
+
+def _run_shard(process_shard: Callable, shard_dir, shard: int, options: Dict[str, Any]) -> int:
+    try:
+        if not options.get("profile"):
+            return process_shard(shard_input_path(shard_dir, shard), shard_output_path(shard_dir, shard), options)
+        instrumentation.reset()
+        count = process_shard(shard_input_path(shard_dir, shard), shard_output_path(shard_dir, shard), options)
+        instrumentation.write_report(shard_metrics_path(shard_dir, shard))
+        return count
+    except Exception:
+        # Tracebacks of worker processes do not survive pickling intact
+        raise RuntimeError(f"shard {shard} failed:\n{traceback.format_exc()}")
+
+
+def run_shards(process_shard: Callable, shard_dir, n_shards: int, workers: int,
+               options: Dict[str, Any]) -> List[int]:
+    """Process every shard without an output file in a process pool.
+
+    ``process_shard(input_path, output_path, options)`` must be a module
+    level function; each worker process keeps the models it loads, so a
+    model is loaded once per worker and not once per shard.
+
+    With a true ``options["profile"]``, every shard writes its worker's
+    stage metrics, and those of all finished shards are merged into the
+    metrics of this process.
+
+    Returns:
+        list: The shards that failed. Rerunning retries only those.
+    """
+    todo = [shard for shard in range(n_shards) if not shard_output_path(shard_dir, shard).exists()]
+    if len(todo) < n_shards:
+        print(f"Shards: {n_shards - len(todo)} of {n_shards} already done, processing {len(todo)}")
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_run_shard, process_shard, shard_dir, shard, options): shard for shard in todo}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                print(f"Shard {shard}: {future.result()} records")
+            except Exception as error:
+                print(error)
+                failed.append(shard)
+    if options.get("profile"):
+        for shard in range(n_shards):
+            path = shard_metrics_path(shard_dir, shard)
+            if path.exists():
+                instrumentation.METRICS.merge(json.loads(path.read_text(encoding="utf-8")))
+    return sorted(failed)
+
+
+def iter_merged_shards(shard_dir, n_shards: int) -> Iterator[Dict[str, Any]]:
+    """Yield the output records of all shards, ordered by input position.
+
+    Every shard output is already in input order, so a heap merge of the
+    files gives the order of a single-process run without loading them.
+    """
+    outputs = [iter_json_records(shard_output_path(shard_dir, shard)) for shard in range(n_shards)]
+    return heapq.merge(*outputs, key=lambda record: record["index"])
+
+
+def run_sharded(input_path, shard_dir, n_shards: int, workers: int,
+                process_shard: Callable, options: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Split, process and merge; raise if a shard failed.
+
+    Returns:
+        iterator: The merged shard output records in input order.
+    """
+    entries = split_into_shards(input_path, shard_dir, n_shards)
+    print(f"Split {entries} entries into {n_shards} shards in {shard_dir}")
+    failed = run_shards(process_shard, shard_dir, n_shards, workers, options)
+    if failed:
+        raise SystemExit(
+            f"Shards {', '.join(map(str, failed))} failed; rerun the same command to retry only those"
+        )
+    return iter_merged_shards(shard_dir, n_shards)
+
+
+def remove_shards(shard_dir, n_shards: int) -> None:
+    """Delete the shard files and manifest after a successful merge."""
+    shard_dir = Path(shard_dir)
+    for shard in range(n_shards):
+        for path in (shard_input_path(shard_dir, shard), shard_output_path(shard_dir, shard),
+                     shard_metrics_path(shard_dir, shard), shard_cache_path(shard_output_path(shard_dir, shard))):
+            if path.exists():
+                path.unlink()
+    (shard_dir / MANIFEST_NAME).unlink(missing_ok=True)
+    if not any(shard_dir.iterdir()):
+        shard_dir.rmdir()
@@ -0,0 +1,86 @@
+"""Process-wide registry of loaded spaCy pipelines."""
+
+import time
+from typing import Dict, List, Tuple
+
+import spacy
+from spacy.language import Language
+
+# Components not needed when only doc.ents is read. "tok2vec" and
+# "transformer" stay, since the NER component may listen to them.
+ENTITY_ONLY_EXCLUDE: List[str] = [
+    "tagger",
+    "morphologizer",
+    "parser",
+    "senter",
+    "attribute_ruler",
+    "lemmatizer",
+]
+
+# (model name, entity_only) -> loaded pipeline
+_MODELS: Dict[Tuple[str, bool], Language] = {}
+
+# (model name, entity_only) -> seconds spent in spacy.load
+LOAD_SECONDS: Dict[Tuple[str, bool], float] = {}
+
+
+def is_model_available(model_name: str) -> bool:
+    """Check whether a spaCy model package is installed, without loading it.
+
+    Args:
+        model_name (str): Name of the spaCy model.
+
+    Returns:
+        bool: True if the package metadata can be found.
+    """
+    return spacy.util.is_package(model_name)
+
+
+def load_model(model_name: str, entity_only: bool = False) -> Language:
+    """Load a spaCy pipeline from disk, bypassing the registry.
+
+    Args:
+        model_name (str): Name of the installed spaCy model.
+        entity_only (bool): Exclude every component that does not
+            contribute to ``doc.ents``.
+
+    Returns:
+        Language: The loaded pipeline.
+    """
+    if entity_only:
+        return spacy.load(model_name, exclude=ENTITY_ONLY_EXCLUDE)
+    return spacy.load(model_name)
+
+
+def get_model(model_name: str, entity_only: bool = False) -> Language:
+    """Return the pipeline for a model, loading it on first use only.
+
+    Every caller in the process shares the same instance, so a model is
+    read from disk at most once per (name, entity_only) combination.
+    """
+    key = (model_name, entity_only)
+    if key not in _MODELS:
+        started = time.perf_counter()
+        _MODELS[key] = load_model(model_name, entity_only)
+        LOAD_SECONDS[key] = time.perf_counter() - started
+    return _MODELS[key]
+
+
+def cold_start_report(import_seconds: float, model_name: str, entity_only: bool = False) -> str:
+    """Load a model through the registry and describe the startup cost.
+
+    Args:
+        import_seconds (float): Time the calling module took to import.
+        model_name (str): Model to load.
+        entity_only (bool): Whether to load the entity-only pipeline.
+
+    Returns:
+        str: One line with import, model load and total seconds.
+    """
+    get_model(model_name, entity_only)
+    load_seconds = LOAD_SECONDS.get((model_name, entity_only), 0.0)
+    mode = " (entity-only)" if entity_only else ""
+    return (
+        f"Cold start: import {import_seconds:.2f}s, load {model_name}{mode} "
+        f"{load_seconds:.2f}s, total {import_seconds + load_seconds:.2f}s"
+    )
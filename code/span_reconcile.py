@@ -0,0 +1,127 @@
+"""Reconcile overlapping NER spans from several annotators with a sweep line."""
+
+from collections import Counter
+from typing import Iterable, Iterator, List, Tuple
+
+# (start, end, label, annotator)
+Vote = Tuple[int, int, str, int]
+SpanKey = Tuple[int, int, str]
+
+
+def overlap_ratio(start: int, end: int, other_start: int, other_end: int) -> float:
+    """Overlap of two intervals as a fraction of the shorter one."""
+    shorter = min(end - start, other_end - other_start)
+    if shorter <= 0:
+        return 0.0
+    return max(0, min(end, other_end) - max(start, other_start)) / shorter
+
+
+def overlap_groups(votes: Iterable[Vote], min_overlap: float = 0.5) -> Iterator[List[Vote]]:
+    """Group spans that overlap each other, in one sweep over the sorted spans.
+
+    Spans are visited by start offset and compared with every earlier span
+    that has not ended yet. Two spans are linked when they overlap by at
+    least ``min_overlap`` of the shorter one, and a group is a chain of
+    linked spans. Linking checks each span rather than the group's extent,
+    so a wide span joins the spans it covers without widening the group
+    for the others. Groups are yielded in text order.
+    """
+    ordered = sorted(votes)
+    parent = list(range(len(ordered)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    active: List[int] = []
+    for index, (start, end, _, _) in enumerate(ordered):
+        active = [other for other in active if ordered[other][1] > start]
+        for other in active:
+            if overlap_ratio(start, end, ordered[other][0], ordered[other][1]) >= min_overlap:
+                parent[find(index)] = find(other)
+        active.append(index)
+
+    groups = {}
+    for index, vote in enumerate(ordered):
+        groups.setdefault(find(index), []).append(vote)
+    yield from groups.values()
+
+
+def quorum_extents(votes: List[Vote], required: int) -> List[Tuple[int, int, int]]:
+    """Return the stretches covered by at least ``required`` annotators.
+
+    Sweeps the start/end events of the spans, counting every annotator at
+    most once.
+
+    Returns:
+        list: (start, end, most annotators covering it) of every maximal
+        stretch that meets the quorum, in text order.
+    """
+    events = sorted((offset, delta, annotator) for start, end, _, annotator in votes
+                    for offset, delta in ((start, 1), (end, -1)))
+    covering = Counter()
+    coverage = 0
+    extents = []
+    first = peak = None
+    for offset, delta, annotator in events:
+        was_covering = covering[annotator] > 0
+        covering[annotator] += delta
+        if (covering[annotator] > 0) == was_covering:
+            continue
+        if was_covering:
+            if coverage == required and offset > first:
+                extents.append((first, offset, peak))
+            coverage -= 1
+        else:
+            coverage += 1
+            if coverage == required:
+                first, peak = offset, coverage
+            elif coverage > required:
+                peak = max(peak, coverage)
+    return extents
+
+
+def resolve_group(group: List[Vote], required: int) -> List[SpanKey]:
+    """Pick the labels and boundaries of one group of overlapping spans.
+
+    Every label yields a span wherever at least ``required`` of its
+    annotators agree, e.g. "$2 billion" and "2 billion" resolve to
+    "2 billion" with a quorum of two. A group can resolve to several
+    spans, such as an amount and a date that one annotator marked as a
+    single wide span. Where spans of different labels overlap, the one
+    with more annotators wins; ties go to the label seen first.
+    """
+    labels = []
+    for _, _, label, _ in group:
+        if label not in labels:
+            labels.append(label)
+    candidates = []
+    for rank, label in enumerate(labels):
+        for start, end, peak in quorum_extents([vote for vote in group if vote[2] == label], required):
+            candidates.append((-peak, rank, start, end, label))
+
+    spans: List[SpanKey] = []
+    for _, _, start, end, label in sorted(candidates):
+        if all(end <= other_start or start >= other_end for other_start, other_end, _ in spans):
+            spans.append((start, end, label))
+    return sorted(spans)
+
+
+def reconcile_spans(votes: Iterable[Vote], required: int, min_overlap: float = 0.5) -> List[SpanKey]:
+    """Merge the spans of several annotators, tolerating boundary differences.
+
+    Args:
+        votes: (start, end, label, annotator) for every annotated span.
+        required (int): Annotators that must agree on a span.
+        min_overlap (float): Overlap, as a fraction of the shorter span,
+            needed to treat two spans as the same entity.
+
+    Returns:
+        list: (start, end, label) of the reconciled spans, in text order.
+    """
+    spans = []
+    for group in overlap_groups(votes, min_overlap):
+        spans.extend(resolve_group(group, required))
+    return sorted(spans)
@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+
+# Shared helpers live in the code/ directory next to this one
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from dedup import member_record, reanchor
+from ner_tasks import build_ner_task
+
+REPRESENTATIVE = {
+    "url": "a", "label": "false",
+    "claim": "Sales rose 5 percent in 2019.",
+    "doc": "The company said sales rose 5 percent in 2019, to $2 billion.",
+}
+MEMBER = dict(REPRESENTATIVE, url="b", doc="Sales rose 5 percent in 2019, to $2 billion, the company said.")
+
+
+def entities(text, *surfaces):
+    return [{"start": text.index(s), "end": text.index(s) + len(s), "label": "X", "text": s} for s in surfaces]
+
+
+def tagged(entry):
+    return {entry["url"]: {
+        "label": entry["label"],
+        "claim": entry["claim"],
+        "claim_entities": entities(entry["claim"], "5 percent", "2019"),
+        "doc": entry["doc"],
+        "doc_entities": entities(entry["doc"], "5 percent", "2019", "$2 billion"),
+    }}
+
+
+def test_reanchor_follows_the_aligned_words():
+    old, new = "a 5 b 5", "x y a 5 b 5 c"
+    moved, lost = reanchor([{"start": 6, "end": 7}], old, new)
+    assert (moved[0]["start"], lost) == (10, 0)
+    assert reanchor(entities("a 5", "5"), "a 5", "a six") == ([], 1)
+
+
+def test_tagged_member_gets_its_own_text_and_entities():
+    body = member_record(tagged(REPRESENTATIVE), MEMBER, "a")["b"]
+    assert body["doc"] == MEMBER["doc"] and body["duplicate_of"] == "a"
+    assert body["claim_entities"] == tagged(REPRESENTATIVE)["a"]["claim_entities"]
+    assert body["doc_entities"] == tagged(MEMBER)["b"]["doc_entities"]
+    assert "needs_tagging" not in body
+
+
+def test_tagged_member_with_unmatched_entities_needs_tagging():
+    member = dict(MEMBER, doc="Sales rose in 2019.")
+    body = member_record(tagged(REPRESENTATIVE), member, "a")["b"]
+    assert body["needs_tagging"] == ["doc"]
+    assert [e["text"] for e in body["doc_entities"]] == ["2019"]
+
+
+def test_annotated_member_keeps_spans():
+    example = build_ner_task("a", tagged(REPRESENTATIVE)["a"])
+    example.update(answer="accept", _input_hash=1)
+
+    same = member_record(example, dict(REPRESENTATIVE, url="c"), "a")
+    assert same["spans"] == example["spans"] and same["answer"] == "accept"
+    assert same["meta"]["url"] == "c" and same["meta"]["duplicate_of"] == "a"
+
+    task = member_record(example, MEMBER, "a")
+    assert task["spans"] == build_ner_task("b", tagged(MEMBER)["b"])["spans"]
+    assert task["meta"]["needs_annotation"] and "answer" not in task
@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+import spacy
+
+# Shared helpers live in the code/ directory next to this one
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from entity_cache import EntityCache, run_cached
+
+
+def test_warm_cache_does_not_read_ahead(tmp_path):
+    cache = EntityCache(str(tmp_path / "cache.sqlite"), spacy.blank("en"), "test")
+    texts = [f"text {i}" for i in range(50)]
+
+    def run(uncached):
+        return ([len(text)] for text in uncached)
+
+    assert list(run_cached(texts, run, cache, window=8)) == [[len(text)] for text in texts]
+
+    pulled = []
+
+    def reader():
+        for text in texts + ["a new text"]:
+            pulled.append(text)
+            yield text
+
+    results = run_cached(reader(), run, cache, window=8)
+    assert next(results) == [len(texts[0])]
+    assert len(pulled) == 8
+    assert list(results)[-1] == [len("a new text")]
@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Shared helpers live in the code/ directory next to this one
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from numeric_values import convert_phrase, parse_numeric
+
+# convert_phrase results of the baseline implementation in process_claims.py,
+# including phrases on which word2number raises IndexError internally
+BASELINE = {
+    "million thousand.": "1,000,000",
+    "billion million": "1,000,000,000,000,000",
+    "million. one": "1",
+    "thousand. dollars 5 twenty": "20",
+    "- thousand. two and": "2",
+    "$5 million": "$5,000,000",
+    "one hundred twenty three": "123",
+    "two point five": "2.5",
+    "fifty percent": "50",
+    "1,000 thousand": "1,000,000",
+    "hello": None,
+}
+
+
+@pytest.mark.parametrize("phrase,expected", sorted(BASELINE.items()))
+def test_convert_phrase_matches_baseline(phrase, expected):
+    parse_numeric.cache_clear()
+    assert convert_phrase(phrase) == expected
+
+
+def test_unreadable_number_words_have_no_magnitude():
+    assert parse_numeric("million. one").magnitude is None
+
+
+@pytest.mark.parametrize("phrase", ["thousand five seven", "million five three", ""])
+def test_unreadable_number_words_do_not_raise(phrase):
+    parse_numeric.cache_clear()
+    assert convert_phrase(phrase) is None
+    assert parse_numeric(phrase).magnitude is None
+
+
+def test_process_claim_keeps_unreadable_number_words():
+    from process_claims import process_claim
+
+    assert process_claim("It rose by thousand five seven times").startswith("It rose by")
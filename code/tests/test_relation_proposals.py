@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Shared helpers live in the code/ directory next to this one
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from relation_proposals import MATCH_TOLERANCE, propose_relations, tolerance_bucket
+
+
+def propose(claim_text, claim_label, doc_numbers):
+    """Propose relations for a claim number and (text, label) document numbers."""
+    text = claim_text + " |"
+    spans = [{"start": 0, "end": len(claim_text), "label": claim_label}]
+    claim = (0, len(text))
+    for number, label in doc_numbers:
+        text += " "
+        spans.append({"start": len(text), "end": len(text) + len(number), "label": label})
+        text += number
+    relations = propose_relations(text, spans, claim)
+    return [(text[r["child_span"]["start"]:r["child_span"]["end"]], r["label"]) for r in relations]
+
+
+def test_dates_match_on_the_whole_date():
+    assert propose("May 5, 2019", "DATE", [("June 5, 2020", "DATE")]) == []
+    assert propose("May 5, 2019", "DATE", [("5 May 2019", "DATE")]) == [("5 May 2019", "MATCHES")]
+    assert propose("2019", "DATE", [("2018", "DATE")]) == []
+
+
+def test_amounts_need_the_same_unit():
+    assert propose("50 kg", "QUANTITY", [("50 miles", "QUANTITY")]) == []
+    assert propose("50 kg", "QUANTITY", [("50 kg", "QUANTITY")]) == [("50 kg", "MATCHES")]
+    assert propose("50 kg", "QUANTITY", [("70 miles", "QUANTITY"), ("70 kg", "QUANTITY")]) == [
+        ("70 kg", "INCONSISTENT")
+    ]
+
+
+def test_currency_on_one_side_still_matches():
+    assert propose("$2 billion", "MONEY", [("2,000,000,000", "MONEY")]) == [("2,000,000,000", "MATCHES")]
+    assert propose("$2 billion", "MONEY", [("€2 billion", "MONEY")]) == []
+
+
+@pytest.mark.parametrize("claim,doc,expected", [
+    ("$1.9 billion", "1,930,000,000", "MATCHES"),
+    ("100", "104.9", "MATCHES"),
+    ("100", "95.3", "MATCHES"),
+    ("100", "106", "INCONSISTENT"),
+    ("100", "250", None),
+])
+def test_tolerance(claim, doc, expected):
+    relations = propose(claim, "CARDINAL", [(doc, "CARDINAL")])
+    assert relations == ([(doc, expected)] if expected else [])
+
+
+@pytest.mark.parametrize("value", [1, 9.99, 100, 1234.5, 1e9, -42])
+def test_values_within_tolerance_share_or_neighbour_a_bucket(value):
+    sign, bucket = tolerance_bucket(value, MATCH_TOLERANCE)
+    for other in (value * (1 - MATCH_TOLERANCE), value * (1 + MATCH_TOLERANCE / 1.1)):
+        other_sign, other_bucket = tolerance_bucket(other, MATCH_TOLERANCE)
+        assert other_sign == sign
+        assert abs(other_bucket - bucket) <= 1
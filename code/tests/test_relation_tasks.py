@@ -0,0 +1,66 @@
+import json
+import sys
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+import spacy
+
+# Shared helpers live in the code/ directory next to this one
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from context_server import ContextStore, serve_contexts
+from ner_tasks import build_ner_task
+from relation_tasks import build_relation_task, document_offsets
+from token_cache import tokens_from_doc
+
+DOC = " ".join(["Filler text without numbers."] * 30 + ["Sales rose 5 percent."] + ["More filler."] * 30
+               + ["Costs fell 3 percent."])
+
+
+def example():
+    claim = "Sales rose 5 percent."
+    eg = build_ner_task("a", {
+        "label": "true", "claim": claim, "doc": DOC,
+        "claim_entities": [{"start": 11, "end": 20, "label": "PERCENT"}],
+        "doc_entities": [{"start": DOC.index(s), "end": DOC.index(s) + 9, "label": "PERCENT"}
+                         for s in ("5 percent", "3 percent")],
+    })
+    tokens = tokens_from_doc(spacy.blank("en")(eg["text"]))
+    for span in eg["spans"]:
+        span["token_start"] = next(t["id"] for t in tokens if t["start"] == span["start"])
+        span["token_end"] = next(t["id"] for t in tokens if t["end"] == span["end"])
+    return eg, tokens
+
+
+@pytest.fixture
+def contexts():
+    store = ContextStore()
+    yield store
+    store.close()
+
+
+def test_window_segments_map_spans_back(contexts):
+    eg, tokens = example()
+    task = build_relation_task(eg, tokens, window=20, contexts=contexts)
+    assert len(task["text"]) < len(eg["text"])
+    segments = task["meta"]["window_segments"]
+    for span, original in zip(task["spans"], eg["spans"]):
+        assert document_offsets(segments, span["start"], span["end"]) == (original["start"], original["end"])
+    separator = task["text"].index(" [...] ")
+    assert document_offsets(segments, separator, separator + 7) is None
+
+
+def test_context_server_needs_the_token(contexts):
+    eg, tokens = example()
+    task = build_relation_task(eg, tokens, window=20, contexts=contexts)
+    server = serve_contexts(contexts)
+    url = f"http://localhost:{server.server_address[1]}/context/{task['context_key']}"
+    try:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url + "?token=wrong")
+        assert error.value.code == 403
+        with urllib.request.urlopen(f"{url}?token={server.token}") as response:
+            assert json.load(response)["text"] == eg["text"]
+    finally:
+        server.shutdown()
@@ -0,0 +1,29 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+# Shared helpers live in the code/ directory next to this one
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from sharding import shard_output_path, split_into_shards, write_shard_output
+
+
+def write_entries(path, urls):
+    path.write_text(json.dumps([{"url": url} for url in urls]), encoding="utf-8")
+
+
+def test_changed_input_is_split_again(tmp_path):
+    input_path, shard_dir = tmp_path / "entries.json", tmp_path / "shards"
+    write_entries(input_path, ["a", "b", "c"])
+    assert split_into_shards(input_path, shard_dir, 2) == 3
+    write_shard_output(shard_output_path(shard_dir, 0), [{"index": 0}])
+
+    # Unchanged input: the split and the finished shard are reused
+    assert split_into_shards(input_path, shard_dir, 2) == 3
+    assert shard_output_path(shard_dir, 0).exists()
+
+    write_entries(input_path, ["a", "b", "c", "d"])
+    stat = input_path.stat()
+    os.utime(input_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert split_into_shards(input_path, shard_dir, 2) == 4
+    assert not shard_output_path(shard_dir, 0).exists()
@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+# Shared helpers live in the code/ directory next to this one
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from span_reconcile import overlap_groups, reconcile_spans
+
+
+def test_wide_span_does_not_hide_quorum_spans():
+    votes = [
+        (0, 18, "MONEY", 0),
+        (0, 10, "MONEY", 1), (14, 18, "DATE", 1),
+        (0, 10, "MONEY", 2), (14, 18, "DATE", 2),
+    ]
+    expected = [(0, 10, "MONEY"), (14, 18, "DATE")]
+    assert reconcile_spans(votes, 2) == expected
+    assert reconcile_spans(votes[1:], 2) == expected
+
+
+def test_wide_span_keeps_same_label_spans_apart():
+    votes = [
+        (0, 18, "MONEY", 0),
+        (0, 10, "MONEY", 1), (14, 18, "MONEY", 1),
+        (0, 10, "MONEY", 2), (14, 18, "MONEY", 2),
+    ]
+    assert reconcile_spans(votes, 2) == [(0, 10, "MONEY"), (14, 18, "MONEY")]
+
+
+def test_boundaries_resolve_to_where_the_quorum_agrees():
+    # "$2 billion" and "2 billion"
+    votes = [(0, 10, "MONEY", 0), (1, 10, "MONEY", 1)]
+    assert reconcile_spans(votes, 2) == [(1, 10, "MONEY")]
+    assert reconcile_spans(votes, 3) == []
+
+
+def test_majority_label_wins_overlapping_spans():
+    votes = [(0, 10, "MONEY", 0), (0, 10, "MONEY", 1), (1, 10, "CARDINAL", 2)]
+    assert reconcile_spans(votes, 1) == [(0, 10, "MONEY")]
+
+
+def test_groups_chain_through_linked_spans():
+    votes = [(0, 20, "MONEY", 0), (0, 10, "MONEY", 1), (12, 20, "MONEY", 2)]
+    assert list(overlap_groups(votes)) == [sorted(votes)]
+    assert list(overlap_groups(votes[1:])) == [[votes[1]], [votes[2]]]
@@ -0,0 +1,86 @@
+"""Split long texts into paragraph- or sentence-aligned chunks."""
+
+import re
+from bisect import bisect_right
+from typing import List, Tuple
+
+DEFAULT_MAX_CHARS = 10_000
+
+# Boundaries are positions where a new chunk may start
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"[.!?][\"')\]]*\s+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _boundaries(pattern: re.Pattern, text: str) -> List[int]:
+    return [match.end() for match in pattern.finditer(text)]
+
+
+def _last_boundary(boundaries: List[int], start: int, limit: int) -> int:
+    """Return the last boundary in (start, limit], or -1 if there is none."""
+    index = bisect_right(boundaries, limit) - 1
+    if index >= 0 and boundaries[index] > start:
+        return boundaries[index]
+    return -1
+
+
+def split_into_sentences(text: str) -> List[Tuple[int, str]]:
+    """Split text at sentence ends and paragraph breaks without a parser.
+
+    Like split_into_chunks, the pieces cover the text exactly.
+
+    Returns:
+        list: (start offset, sentence text) pairs.
+
+    Example:
+        >>> split_into_sentences("It cost $5. Then $6")
+        [(0, 'It cost $5. '), (12, 'Then $6')]
+    """
+    starts = sorted(set(_boundaries(_SENTENCE_RE, text)) | set(_boundaries(_PARAGRAPH_RE, text)))
+    starts = [0] + [start for start in starts if 0 < start < len(text)]
+    ends = starts[1:] + [len(text)]
+    return [(start, text[start:end]) for start, end in zip(starts, ends)]
+
+
+def split_into_chunks(text: str, max_chars: int = DEFAULT_MAX_CHARS) -> List[Tuple[int, str]]:
+    """Split text into consecutive chunks of at most max_chars characters.
+
+    Chunks end at a paragraph break where possible, then at a sentence end,
+    then at whitespace, and only as a last resort in the middle of a word.
+    The chunks cover the text exactly, so an offset inside a chunk maps back
+    to the original text by adding the chunk's start offset.
+
+    Args:
+        text (str): The text to split.
+        max_chars (int): Maximum length of a chunk.
+
+    Returns:
+        list: (start offset, chunk text) pairs. Always contains at least one
+        chunk, so an empty text yields [(0, "")].
+
+    Example:
+        >>> split_into_chunks("One. Two.", max_chars=6)
+        [(0, 'One. '), (5, 'Two.')]
+    """
+    if len(text) <= max_chars:
+        return [(0, text)]
+
+    levels = [
+        _boundaries(_PARAGRAPH_RE, text),
+        _boundaries(_SENTENCE_RE, text),
+        _boundaries(_WHITESPACE_RE, text),
+    ]
+    chunks = []
+    start = 0
+    while len(text) - start > max_chars:
+        limit = start + max_chars
+        end = limit
+        for boundaries in levels:
+            boundary = _last_boundary(boundaries, start, limit)
+            if boundary != -1:
+                end = boundary
+                break
+        chunks.append((start, text[start:end]))
+        start = end
+    chunks.append((start, text[start:]))
+    return chunks
@@ -0,0 +1,126 @@
+"""Pre-computed Prodigy tokens for annotation tasks, keyed by task text."""
+
+import hashlib
+import json
+import sqlite3
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from spacy.language import Language
+
+TOKEN_CACHE_SUFFIX = ".tokens.sqlite"
+
+Token = Dict[str, Any]
+
+
+def task_key(text: str) -> str:
+    """Return the input hash used to look up the tokens of a task text."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def default_token_cache_path(corpus_path) -> Path:
+    """Return where pretokenize.py writes the tokens of a corpus file."""
+    corpus_path = Path(corpus_path)
+    return corpus_path.with_name(corpus_path.name + TOKEN_CACHE_SUFFIX)
+
+
+class TokenCache:
+    """SQLite store of task tokens, shared read-only by the recipe servers."""
+
+    def __init__(self, path, readonly: bool = True):
+        """Open the token store.
+
+        Args:
+            path: Location of the SQLite file.
+            readonly (bool): Open without write access, so several recipe
+                processes can read the same file safely.
+        """
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{Path(path)}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(str(path))
+            self.conn.execute("CREATE TABLE IF NOT EXISTS tokens (key TEXT PRIMARY KEY, tokens TEXT NOT NULL)")
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text: str) -> Optional[List[Token]]:
+        """Return the cached tokens of a task text, or None on a miss."""
+        row = self.conn.execute("SELECT tokens FROM tokens WHERE key = ?", (task_key(text),)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, text: str, tokens: List[Token]) -> None:
+        """Store the tokens of a task text."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO tokens (key, tokens) VALUES (?, ?)",
+            (task_key(text), json.dumps(tokens, ensure_ascii=False)),
+        )
+
+    def close(self) -> None:
+        """Commit and close the store."""
+        self.conn.commit()
+        self.conn.close()
+
+
+def open_token_cache(path) -> Optional[TokenCache]:
+    """Open a token store for reading, or return None if it does not exist."""
+    if path is None or not Path(path).exists():
+        return None
+    return TokenCache(path)
+
+
+def tokens_from_doc(doc) -> List[Token]:
+    """Convert a spaCy Doc into Prodigy's token format."""
+    return [
+        {
+            "text": token.text,
+            "start": token.idx,
+            "end": token.idx + len(token.text),
+            "id": token.i,
+            "ws": bool(token.whitespace_),
+        }
+        for token in doc
+    ]
+
+
+def align_spans(spans: List[Dict[str, Any]], tokens: List[Token]) -> None:
+    """Set token_start/token_end on spans that lack them.
+
+    A span that does not line up with token boundaries is expanded to the
+    tokens it touches.
+    """
+    starts = [token["start"] for token in tokens]
+    ends = [token["end"] for token in tokens]
+    for span in spans:
+        if "token_start" in span and "token_end" in span:
+            continue
+        span["token_start"] = max(bisect_right(starts, span["start"]) - 1, 0)
+        span["token_end"] = min(bisect_left(ends, span["end"]), len(tokens) - 1)
+
+
+def get_tokens(nlp: Language, text: str, cache: Optional[TokenCache] = None) -> List[Token]:
+    """Return the tokens of a text from the cache, tokenizing on a miss."""
+    tokens = cache.get(text) if cache is not None else None
+    if tokens is None:
+        tokens = tokens_from_doc(nlp.make_doc(text))
+    return tokens
+
+
+def attach_tokens(
+    nlp: Language, stream: Iterable[Dict[str, Any]], cache: Optional[TokenCache] = None
+) -> Iterator[Dict[str, Any]]:
+    """Add tokens to every task of a stream, like Prodigy's add_tokens.
+
+    Tokens come from the cache when the task text was pre-tokenized and
+    are only computed with ``nlp``'s tokenizer on a miss. Tasks that already
+    carry tokens keep them. Spans get their token_start/token_end.
+    """
+    for task in stream:
+        if "tokens" not in task:
+            task["tokens"] = get_tokens(nlp, task["text"], cache)
+        align_spans(task.get("spans", []), task["tokens"])
+        yield task
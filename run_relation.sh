@@ -3,8 +3,12 @@
 # Name of the conda environment
 VEnv="Prodigy_Env"
 
+# Port of the context server that serves the full documents with --window;
+# open it to the annotators together with 8084
+CONTEXT_PORT=8085
+
 # Commands to run in each screen session
-command="PRODIGY_HOST=0.0.0.0 PRODIGY_PORT=8084 python -m prodigy numerical_relations Numeric_Relations_DB -F code/Recipe/Relational_Recipe.py"
+command="PRODIGY_HOST=0.0.0.0 PRODIGY_PORT=8084 python -m prodigy numerical_relations Numeric_Relations_DB -F code/Recipe/Relational_Recipe.py --context-port ${CONTEXT_PORT}"
 screen_name="prodigy_Relation"
 
 